@@ -4,12 +4,22 @@
 # in a separate library, but as it is currently only used in two places, that seemed overkill.
 
 from dataclasses import dataclass
+import hashlib
 import uuid
 import json
 from enum import Enum, auto
 from urllib.parse import urlparse, urlsplit
 from os.path import basename
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
 
 @dataclass(eq=True, frozen=True)
 class _Reference:
@@ -19,6 +29,7 @@ class _Reference:
 
 
 class _Item:
+    __slots__ = ['id', 'score', 'terms', 'pages', 'count', 'lemma', 'coordinates', 'references']
 
     def __init__(self, id_str: str):
         self.id: str = id_str
@@ -30,6 +41,19 @@ class _Item:
         self.coordinates: (float, float) = None
         self.references: {_Reference} = set()
 
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'score': self.score,
+            'terms': sorted(self.terms),
+            'pages': sorted(self.pages),
+            'count': self.count,
+            'lemma': self.lemma,
+            'coordinates': self.coordinates,
+            'references': [{'id': r.id, 'url': r.url, 'type': r.type}
+                           for r in sorted(self.references, key=lambda r: (r.id, r.url, r.type))]
+        }
+
 
 class Kind(Enum):
     person = auto()
@@ -38,6 +62,31 @@ class Kind(Enum):
     timex = auto()
 
 
+def item_id(kind: Kind, lemma: str) -> str:
+    """
+    A stable id for the item of the lemma, so that the output is the same each time it is
+    generated from the same input. It has the format of a uuid, as the former random ids.
+    """
+    digest = hashlib.blake2b(f'{kind.name}\t{lemma}'.encode('utf-8'), digest_size=16).digest()
+    return str(uuid.UUID(bytes=digest))
+
+
+def _dumps(result: dict, compact: bool, backend: str) -> str:
+    if backend == 'orjson':
+        if orjson is None:
+            raise ValueError('orjson is not installed')
+        if not compact:
+            raise ValueError('orjson only writes compact json')
+        return orjson.dumps(result).decode('utf-8')
+    if backend == 'ujson':
+        if ujson is None:
+            raise ValueError('ujson is not installed')
+        return ujson.dumps(result, indent=0 if compact else 4, escape_forward_slashes=False)
+    if compact:
+        return json.dumps(result, separators=(',', ':'))
+    return json.dumps(result, indent=4)
+
+
 def parse_reference_from_url(url: str):
     """
     Used to convert a URL into the reference format values that the book viewer expects.
@@ -79,10 +128,13 @@ class BookViewerJsonBuilder:
     def _item(self, kind: Kind, lemma: str) -> _Item:
         item_d = self._item_d(kind)
         if lemma not in item_d:
-            item_d[lemma] = _Item(str(uuid.uuid1()))
+            item_d[lemma] = _Item(item_id(kind, lemma))
             item_d[lemma].lemma = lemma
         return item_d[lemma]
 
+    def lemmas(self, kind: Kind) -> [str]:
+        return list(self._kinds_to_item_dicts.get(kind, {}))
+
     def add_occurence(self, kind: Kind, lemma: str, page: int, term: str):
         item = self._item(kind, lemma)
         item.pages.add(page)
@@ -97,9 +149,43 @@ class BookViewerJsonBuilder:
         self._item(kind, lemma).score = score
 
     def set_coordinates(self, kind: Kind, lemma: str, coordinates: (float, float)):
+        """
+        :param coordinates: (longitude, latitude), the GeoJSON order of the gazetteer's
+            prefLocation, which the book viewer expects.
+        """
         self._item(kind, lemma).coordinates = coordinates
 
-    def to_json(self) -> str:
+    def merge(self, other: 'BookViewerJsonBuilder') -> 'BookViewerJsonBuilder':
+        """
+        Add the items of the other builder to this one, e.g. to combine builders filled with
+        different pages of a book in separate processes (builders can be pickled). Counts
+        are added up, terms, pages and references joined, scores and coordinates taken from
+        the other builder where it has them. New items are added after the existing ones, so
+        merging builders of consecutive pages in order gives the same output as filling a
+        single builder with all pages.
+
+        :return: This builder.
+        """
+        for kind, other_item_d in other._kinds_to_item_dicts.items():
+            for lemma, other_item in other_item_d.items():
+                item = self._item(kind, lemma)
+                item.terms |= other_item.terms
+                item.pages |= other_item.pages
+                item.count += other_item.count
+                item.references |= other_item.references
+                if other_item.score is not None:
+                    item.score = other_item.score
+                if other_item.coordinates is not None:
+                    item.coordinates = other_item.coordinates
+        return self
+
+    def to_json(self, compact: bool = False, backend: str = 'json') -> str:
+        """
+        :param compact: Leave out indentation and spaces.
+        :param backend: 'json' or, if installed, 'ujson' or 'orjson' (compact only). These
+            produce equivalent JSON, but may escape non-ASCII characters or format floats
+            differently than the json module.
+        """
         kinds_to_keys = {
             Kind.person: 'persons',
             Kind.location: 'locations',
@@ -108,16 +194,6 @@ class BookViewerJsonBuilder:
         }
         result = dict()
         for kind, key in kinds_to_keys.items():
-            if kind in self._kinds_to_item_dicts.keys():
-                result[key] = {'items': list(self._kinds_to_item_dicts[kind].values())}
-            else:
-                result[key] = {'items': []}
-
-        def encode_fn(obj):
-            if isinstance(obj, set):
-                return list(obj)
-            try:
-                return obj.toJSON()
-            except AttributeError:
-                return obj.__dict__
-        return json.dumps(result, default=encode_fn, indent=4)
+            items = self._kinds_to_item_dicts.get(kind, {}).values()
+            result[key] = {'items': [item.to_dict() for item in items]}
+        return _dumps(result, compact, backend)
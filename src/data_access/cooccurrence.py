@@ -0,0 +1,169 @@
+from enum import Enum
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from src.data_access.entity_index import EntityIndex, normalize_text
+from src.data_access.letters import NO_YEAR, Letters, segment_letters
+
+
+class Scope(Enum):
+    SENTENCE = 1
+    PAGE = 2
+    LETTER = 3
+
+
+class Neighbour(NamedTuple):
+    text: str
+    label: str
+    count: int
+    score: float
+
+
+class CooccurrenceMatrix:
+    """
+    The entity x entity co-occurrence matrix of an entity index. An entity is a normalized
+    entity text with its fine label, two entities co-occur if both occur in the same scope,
+    i.e. sentence, page or letter. The matrix counts the scopes two entities co-occur in.
+
+    The matrix is computed from a sparse binary scope x entity incidence matrix in one
+    sparse product. Slices by year keep the scopes of the letters of those years and
+    compute the product again.
+    """
+
+    def __init__(self, texts: List[str], labels: List[str], coarse_labels: List[str],
+                 node_texts: np.ndarray, node_labels: np.ndarray,
+                 incidence: sparse.csr_matrix, scope_years: np.ndarray):
+        self.texts = texts
+        self.labels = labels
+        self.coarse_labels = coarse_labels
+        # the text id and label id of each entity, sorted by text and label
+        self.node_texts = node_texts
+        self.node_labels = node_labels
+        self.incidence = incidence
+        self.scope_years = scope_years
+        self.scope_count = incidence.shape[0]
+        # the number of scopes each entity occurs in
+        self.document_frequencies = np.asarray(incidence.sum(axis=0)).ravel()
+        self.counts: sparse.csr_matrix = (incidence.T @ incidence).tocsr()
+        self.counts.setdiag(0)
+        self.counts.eliminate_zeros()
+        self._text_ids = {text: i for i, text in enumerate(texts)}
+
+    @staticmethod
+    def build(index: EntityIndex, scope: Scope = Scope.LETTER, letters: Letters = None) -> 'CooccurrenceMatrix':
+        """
+        :param letters: The letters of the index, segmented if not given.
+        """
+        letters = letters or segment_letters(index)
+        text_ids = np.asarray(index.text_ids, dtype=np.int64)
+        label_ids = np.asarray(index.label_ids, dtype=np.int64)
+        file_ids = np.asarray(index.file_ids, dtype=np.int64)
+        nodes, node_of_row = np.unique(text_ids * len(index.labels) + label_ids, return_inverse=True)
+
+        row_letters = letters.file_letters[file_ids]
+        if scope == Scope.SENTENCE:
+            scope_keys = file_ids * (int(np.max(index.sentences, initial=0)) + 1) + np.asarray(index.sentences)
+        elif scope == Scope.PAGE:
+            scope_keys = file_ids
+        else:
+            scope_keys = row_letters
+        scope_keys, first_rows, scope_of_row = np.unique(scope_keys, return_index=True, return_inverse=True)
+        incidence = sparse.csr_matrix((np.ones(len(scope_of_row), dtype=np.int32), (scope_of_row, node_of_row)),
+                                      shape=(len(scope_keys), len(nodes)))
+        # duplicates were summed, the incidence is binary
+        incidence.data[:] = 1
+        return CooccurrenceMatrix(
+            texts=index.texts.values,
+            labels=index.labels,
+            coarse_labels=index.coarse_labels,
+            node_texts=nodes // len(index.labels),
+            node_labels=nodes % len(index.labels),
+            incidence=incidence,
+            scope_years=letters.years[row_letters[first_rows]])
+
+    def years(self, first: int, last: int = None) -> 'CooccurrenceMatrix':
+        """
+        :return: The co-occurrences within the scopes from the years first to last (inclusive),
+            scopes of letters without a year are left out.
+        """
+        last = first if last is None else last
+        scopes = (self.scope_years >= first) & (self.scope_years <= last) & (self.scope_years != NO_YEAR)
+        return CooccurrenceMatrix(self.texts, self.labels, self.coarse_labels, self.node_texts, self.node_labels,
+                                  self.incidence[scopes], self.scope_years[scopes])
+
+    def year_range(self) -> Tuple[int, int]:
+        years = self.scope_years[self.scope_years != NO_YEAR]
+        return (int(years.min()), int(years.max())) if len(years) else (NO_YEAR, NO_YEAR)
+
+    def label_mask(self, labels: List[str]) -> np.ndarray:
+        """
+        :return: A boolean array over the entities, True for those with a fine or coarse label in labels.
+        """
+        by_label = np.array([label in labels or coarse in labels
+                             for label, coarse in zip(self.labels, self.coarse_labels)], dtype=bool)
+        return by_label[self.node_labels]
+
+    def nodes(self, text: str, label: str = None) -> np.ndarray:
+        """
+        :return: The ids of the entities with the text and, if given, the fine or coarse label.
+        """
+        text_id = self._text_ids.get(normalize_text(text))
+        if text_id is None:
+            return np.zeros(0, dtype=np.int64)
+        start, stop = np.searchsorted(self.node_texts, [text_id, text_id + 1])
+        nodes = np.arange(start, stop)
+        if label:
+            nodes = nodes[self.label_mask([label])[start:stop]]
+        return nodes
+
+    def scopes(self, text: str, label: str = None) -> np.ndarray:
+        """
+        :return: A boolean array over the scopes, True for those the given entity occurs in.
+        """
+        return np.asarray(self.incidence[:, self.nodes(text, label)].sum(axis=1)).ravel() > 0
+
+    def cooccurrences(self, text: str, label: str = None) -> np.ndarray:
+        """
+        :return: The number of scopes each entity co-occurs in with the given one. If the text
+            and label match several entities, e.g. with a coarse label, a scope counts once
+            for any of them.
+        """
+        nodes = self.nodes(text, label)
+        if len(nodes) == 1:
+            return self.counts[nodes[0]].toarray().ravel()
+        counts = self.incidence.T @ self.scopes(text, label).astype(np.int32)
+        counts[nodes] = 0
+        return counts
+
+    def pmi(self, text: str, label: str = None) -> np.ndarray:
+        """
+        :return: The pointwise mutual information of the given entity with each entity,
+            log(p(a, b) / (p(a) * p(b))) over the scopes, -inf for entities that don't co-occur.
+        """
+        counts = self.cooccurrences(text, label)
+        frequency = np.count_nonzero(self.scopes(text, label))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.log(counts * self.scope_count / (frequency * self.document_frequencies.astype(np.float64)))
+
+    def neighbours(self, text: str, label: str = None, k: int = 10, labels: Optional[List[str]] = None,
+                   by_pmi: bool = False, min_count: int = 1) -> List[Neighbour]:
+        """
+        The top k entities co-occurring with the given one.
+
+        :param labels: If given, only entities with these fine or coarse labels are considered.
+        :param by_pmi: Rank by PMI instead of by co-occurrence count.
+        :param min_count: Leave out entities co-occurring less often, as PMI favours rare ones.
+        """
+        counts = self.cooccurrences(text, label)
+        scores = self.pmi(text, label) if by_pmi else counts.astype(np.float64)
+        candidates = counts >= max(min_count, 1)
+        if labels is not None:
+            candidates &= self.label_mask(labels)
+        candidates = np.flatnonzero(candidates)
+        # ties in order of the entities
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')[:k]]
+        return [Neighbour(self.texts[self.node_texts[node]], self.labels[self.node_labels[node]],
+                          int(counts[node]), float(scores[node]))
+                for node in candidates]
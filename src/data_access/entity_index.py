@@ -0,0 +1,267 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.data_access.labels import LABELS
+from src.data_access.webanno_tsv import (entity_spans, parse_page_number,
+                                         webanno_tsv_read_file,
+                                         webanno_tsv_read_labels)
+
+TABLES_FILE_NAME = 'tables.json'
+
+# The per entity columns of the index
+ENTITY_COLUMNS = ['text_ids', 'head_ids', 'label_ids', 'file_ids', 'sentences']
+# The word postings: for each word all files it occurs in with the number of occurrences, sorted by word and file
+WORD_COLUMNS = ['word_ids', 'word_files', 'word_counts']
+# The entity postings: for each entity text and for each entity's first token text all labels and
+# files it occurs with, distinct and sorted by text, label and file
+POSTING_COLUMNS = ['posting_texts', 'posting_labels', 'posting_files']
+COLUMNS = ENTITY_COLUMNS + WORD_COLUMNS + POSTING_COLUMNS
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.split()).lower()
+
+
+class _Interner:
+
+    def __init__(self, values: List[str] = None):
+        self.values: List[str] = list(values or [])
+        self.ids: Dict[str, int] = {v: i for i, v in enumerate(self.values)}
+
+    def id(self, value: str) -> int:
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.ids[value] = value_id
+            self.values.append(value)
+        return value_id
+
+
+class EntityIndex:
+    """
+    A columnar index of all entity occurrences in a directory of WebAnno TSV files.
+    There is one row per entity occurrence with its lower-cased text and the lower-cased
+    text of its first token (ids into texts), its fine label (id into labels), the file
+    (id into files) and the sentence it starts in. Book and page are kept per file.
+
+    Additionally, the index holds the number of occurrences of each lower-cased token
+    text (id into words) per file, and posting lists of the files each entity text and
+    each entity's first token text occurs in, per label.
+
+    The index is built once, can be saved to a directory and memory-mapped from there.
+    Rows are in the order of the files given on building and within a file in document order.
+    """
+
+    def __init__(self, source_path: str, texts: List[str], labels: List[str], files: List[str],
+                 fingerprints: List[Tuple[int, int]], words: List[str], columns: Dict[str, np.ndarray]):
+        self.source_path = source_path
+        self.texts = _Interner(texts)
+        self.labels = labels
+        self.files = files
+        self.fingerprints = fingerprints
+        self.words = _Interner(words)
+        self.books = [os.path.dirname(f) for f in files]
+        self.pages = np.array([parse_page_number(f) for f in files], dtype=np.int32)
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+        # the coarse label for each of this index's labels
+        self.coarse_labels = [LABELS.coarse(label) for label in labels]
+        # the rows of file i are file_offsets[i]:file_offsets[i + 1]
+        self.file_offsets = np.searchsorted(self.file_ids, np.arange(len(files) + 1))
+
+    def __len__(self) -> int:
+        return len(self.text_ids)
+
+    @staticmethod
+    def _fingerprint(path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def build(source_path: str, files: List[str]) -> 'EntityIndex':
+        """
+        Parse the files and index their entities.
+
+        :param source_path: The directory containing the files, file names are stored relative to it.
+        :param files: The files to index, in the order that rows should have.
+        :raises UnknownLabelError: if any of the files has labels that are not in the label registry.
+        """
+        LABELS.validate_files(files, webanno_tsv_read_labels)
+        source_path = os.path.abspath(source_path)
+        texts, labels, words = _Interner(), _Interner(), _Interner()
+        entity_rows: List[Tuple[int, int, int, int, int]] = []
+        word_rows: List[Tuple[int, int, int]] = []
+        for file_id, path in enumerate(files):
+            doc = webanno_tsv_read_file(path)
+            for span in entity_spans(doc):
+                entity_rows.append((texts.id(normalize_text(span.text)), texts.id(normalize_text(span.tokens[0].text)),
+                                    labels.id(span.label), file_id, span.sentence))
+            word_counts: Dict[int, int] = {}
+            for sentence in doc.sentences:
+                for token in sentence.tokens:
+                    word_id = words.id(token.text.lower())
+                    word_counts[word_id] = word_counts.get(word_id, 0) + 1
+            word_rows.extend((word_id, file_id, count) for word_id, count in word_counts.items())
+
+        entities = np.array(entity_rows, dtype=np.int32).reshape(-1, len(ENTITY_COLUMNS))
+        postings = np.array(sorted(word_rows), dtype=np.int32).reshape(-1, len(WORD_COLUMNS))
+        columns = {name: np.ascontiguousarray(entities[:, i]) for i, name in enumerate(ENTITY_COLUMNS)}
+        columns.update({name: np.ascontiguousarray(postings[:, i]) for i, name in enumerate(WORD_COLUMNS)})
+        columns.update(EntityIndex._entity_postings(entities))
+        return EntityIndex(
+            source_path=source_path,
+            texts=texts.values,
+            labels=labels.values,
+            files=[os.path.relpath(os.path.abspath(f), source_path) for f in files],
+            fingerprints=[EntityIndex._fingerprint(f) for f in files],
+            words=words.values,
+            columns=columns)
+
+    @staticmethod
+    def _entity_postings(entities: np.ndarray) -> Dict[str, np.ndarray]:
+        text_ids, head_ids, label_ids, file_ids = (entities[:, i] for i in range(4))
+        keys = np.concatenate([text_ids, head_ids])
+        label_ids = np.concatenate([label_ids, label_ids])
+        file_ids = np.concatenate([file_ids, file_ids])
+        order = np.lexsort((file_ids, label_ids, keys))
+        postings = np.stack([keys[order], label_ids[order], file_ids[order]], axis=1)
+        distinct = np.ones(len(postings), dtype=bool)
+        distinct[1:] = np.any(postings[1:] != postings[:-1], axis=1)
+        postings = postings[distinct]
+        return {name: np.ascontiguousarray(postings[:, i], dtype=np.int32) for i, name in enumerate(POSTING_COLUMNS)}
+
+    def save(self, index_dir: str):
+        os.makedirs(index_dir, exist_ok=True)
+        tables = {
+            'source_path': self.source_path,
+            'texts': self.texts.values,
+            'labels': self.labels,
+            'files': self.files,
+            'fingerprints': self.fingerprints,
+            'words': self.words.values
+        }
+        with open(os.path.join(index_dir, TABLES_FILE_NAME), mode='w', encoding='utf-8') as f:
+            json.dump(tables, f, ensure_ascii=False)
+        for name in COLUMNS:
+            np.save(os.path.join(index_dir, name + '.npy'), getattr(self, name))
+
+    @staticmethod
+    def exists(index_dir: str) -> bool:
+        return all(os.path.exists(os.path.join(index_dir, name))
+                   for name in [TABLES_FILE_NAME] + [column + '.npy' for column in COLUMNS])
+
+    @staticmethod
+    def load(index_dir: str, mmap_mode: Optional[str] = 'r') -> 'EntityIndex':
+        """
+        Load an index saved with save(). By default the columns are memory-mapped read-only.
+        """
+        with open(os.path.join(index_dir, TABLES_FILE_NAME), mode='r', encoding='utf-8') as f:
+            tables = json.load(f)
+        columns = {name: np.load(os.path.join(index_dir, name + '.npy'), mmap_mode=mmap_mode)
+                   for name in COLUMNS}
+        return EntityIndex(
+            source_path=tables['source_path'],
+            texts=tables['texts'],
+            labels=tables['labels'],
+            files=tables['files'],
+            fingerprints=[tuple(fp) for fp in tables['fingerprints']],
+            words=tables['words'],
+            columns=columns)
+
+    def is_current(self, files: List[str]) -> bool:
+        """
+        Whether the index was built from exactly these files in this order, none of which changed since.
+        """
+        paths = [os.path.relpath(os.path.abspath(f), self.source_path) for f in files]
+        return paths == self.files and all(self._fingerprint(f) == tuple(fp) for f, fp in zip(files, self.fingerprints))
+
+    def label_mask(self, labels: List[str]) -> np.ndarray:
+        """
+        :return: A boolean array over this index's labels, True for those that are in labels
+            as fine or coarse label.
+        """
+        return np.array([label in labels or coarse in labels for label, coarse in zip(self.labels, self.coarse_labels)],
+                        dtype=bool)
+
+    def entity_files(self, text: str, label: str = None) -> np.ndarray:
+        """
+        :param text: An entity text or the text of an entity's first token, matched normalized.
+        :param label: If given, only entities with this fine or coarse label count.
+        :return: The sorted ids of the files containing a matching entity.
+        """
+        text_id = self.texts.ids.get(normalize_text(text))
+        if text_id is None:
+            return np.zeros(0, dtype=np.int32)
+        start, stop = np.searchsorted(self.posting_texts, [text_id, text_id + 1])
+        files = self.posting_files[start:stop]
+        if label:
+            files = files[self.label_mask([label])[self.posting_labels[start:stop]]]
+        # one sorted run of files per label
+        return np.unique(files)
+
+    def token_files(self, word: str) -> np.ndarray:
+        """
+        :return: The sorted ids of the files containing the (lower-cased) token text.
+        """
+        word_id = self.words.ids.get(word.lower())
+        if word_id is None:
+            return np.zeros(0, dtype=np.int32)
+        start, stop = np.searchsorted(self.word_ids, [word_id, word_id + 1])
+        return np.asarray(self.word_files[start:stop])
+
+    def query(self, word_entities: Dict[str, Optional[str]], conjunctive: bool = False,
+              entity_only: bool = True) -> np.ndarray:
+        """
+        Find the files matching all (conjunctive) or any of the words.
+
+        :param word_entities: The words, each with the label of the entities it should match or None for any label.
+        :param entity_only: If False, a word also matches files it occurs in as plain token.
+        :return: The sorted ids of the matching files.
+        """
+        combine = np.intersect1d if conjunctive else np.union1d
+        result = None
+        for word, label in word_entities.items():
+            files = self.entity_files(word, label)
+            if not entity_only:
+                files = np.union1d(files, self.token_files(word))
+            result = files if result is None else combine(result, files)
+        return np.zeros(0, dtype=np.int32) if result is None else result.astype(np.int32)
+
+    def file_rows(self, file_ids: np.ndarray) -> np.ndarray:
+        """
+        :return: The rows of the given files, ascending if the file ids are.
+        """
+        file_ids = np.asarray(file_ids, dtype=np.int64)
+        starts = self.file_offsets[file_ids]
+        lengths = self.file_offsets[file_ids + 1] - starts
+        # a running row number, restarted at each file's start
+        return np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+
+    def frequencies(self, rows: np.ndarray = None) -> Tuple[Dict[str, int], Dict[str, str]]:
+        """
+        Count the entity texts in the rows given by a boolean mask or ascending row numbers (default: all).
+
+        :return: The frequency of each text and the coarse label of its last occurrence,
+            both in order of the texts' first occurrence.
+        """
+        text_ids = np.asarray(self.text_ids)
+        label_ids = np.asarray(self.label_ids)
+        if rows is not None:
+            text_ids, label_ids = text_ids[rows], label_ids[rows]
+        if len(text_ids) == 0:
+            return {}, {}
+        counts = np.bincount(text_ids)
+        unique, first = np.unique(text_ids, return_index=True)
+        _, last_reversed = np.unique(text_ids[::-1], return_index=True)
+        last = len(text_ids) - 1 - last_reversed
+        order = np.argsort(first, kind='stable')
+        text_with_frequencies = {}
+        text_annotations = {}
+        for i in order:
+            text = self.texts.values[unique[i]]
+            text_with_frequencies[text] = int(counts[unique[i]])
+            text_annotations[text] = self.coarse_labels[label_ids[last[i]]]
+        return text_with_frequencies, text_annotations
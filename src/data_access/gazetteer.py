@@ -0,0 +1,92 @@
+import os
+import re
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+RESOURCE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'resources'))
+# Files with lines 'name;authority file id;gazetteer id', later files take precedence for a name
+NAMES_TO_GAZETTEER_IDS_FILES = [
+    os.path.join(RESOURCE_DIR, 'geo-de611-to-gazetteer-ids.csv'),
+    os.path.join(RESOURCE_DIR, 'geo-gnd-to-gazetteer-ids.csv')
+]
+GAZETTEER_PLACE_URL = 'https://gazetteer.dainst.org/place/%s'
+
+EDGE_PUNCTUATION_RE = re.compile(r'^\W+|\W+$')
+
+
+class GazetteerPlace(NamedTuple):
+    id: str
+    url: str
+    # (longitude, latitude) as in the gazetteer's prefLocation, None if unknown
+    coordinates: Optional[Tuple[float, float]]
+
+
+def name_key(name: str) -> str:
+    """
+    The key under which names are looked up if they do not match exactly: NFKC normalized,
+    lower-cased, with single spaces and without punctuation at the edges, e.g. 'Rom ,'.
+    """
+    key = ' '.join(unicodedata.normalize('NFKC', name).casefold().split())
+    return EDGE_PUNCTUATION_RE.sub('', key) or key
+
+
+def read_names_to_gazetteer_ids(paths: Sequence[str] = NAMES_TO_GAZETTEER_IDS_FILES) -> Dict[str, str]:
+    names_to_ids = {}
+    for path in paths:
+        with open(path, mode='r', encoding='utf-8') as f:
+            for line in f:
+                columns = line.split(';')
+                if len(columns) >= 3 and columns[0].strip() and columns[2].strip():
+                    names_to_ids[columns[0].strip()] = columns[2].strip()
+    return names_to_ids
+
+
+def read_coordinates(path: str) -> Dict[str, Tuple[float, float]]:
+    """
+    Read a local snapshot of gazetteer coordinates with lines 'gazetteer id;longitude;latitude'.
+    Lines without valid coordinates, e.g. a header, are left out.
+    """
+    coordinates = {}
+    with open(path, mode='r', encoding='utf-8') as f:
+        for line in f:
+            columns = line.split(';')
+            try:
+                coordinates[columns[0].strip()] = (float(columns[1]), float(columns[2]))
+            except (IndexError, ValueError):
+                continue
+    return coordinates
+
+
+class GazetteerLookup:
+    """
+    Resolves place names to gazetteer places by exact name or else by name_key(). The
+    names and coordinates are read once, each distinct name is resolved once.
+    """
+
+    def __init__(self,
+                 names_paths: Sequence[str] = NAMES_TO_GAZETTEER_IDS_FILES,
+                 coordinates_path: str = None):
+        """
+        :param coordinates_path: A snapshot file for read_coordinates(), without it places
+            have no coordinates.
+        """
+        self.paths: List[str] = list(names_paths) + ([coordinates_path] if coordinates_path else [])
+        self._ids = read_names_to_gazetteer_ids(names_paths)
+        self._ids_by_key: Dict[str, str] = {}
+        for name, gazetteer_id in self._ids.items():
+            self._ids_by_key.setdefault(name_key(name), gazetteer_id)
+        self._coordinates = read_coordinates(coordinates_path) if coordinates_path else {}
+        self._memo: Dict[str, Optional[GazetteerPlace]] = {}
+
+    def resolve(self, name: str) -> Optional[GazetteerPlace]:
+        try:
+            return self._memo[name]
+        except KeyError:
+            pass
+        gazetteer_id = self._ids.get(name) or self._ids_by_key.get(name_key(name))
+        place = None
+        if gazetteer_id:
+            place = GazetteerPlace(gazetteer_id, GAZETTEER_PLACE_URL % gazetteer_id,
+                                   self._coordinates.get(gazetteer_id))
+        self._memo[name] = place
+        return place
@@ -0,0 +1,138 @@
+import json
+import os
+from array import array
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+VOCABULARY_FILE_NAME = 'vocabulary.json'
+
+ARRAY_NAMES = ['tokens', 'fine_tags', 'coarse_tags', 'sentence_offsets']
+
+
+class IobArrays(NamedTuple):
+    """
+    The IOB data of one split as arrays. tokens, fine_tags and coarse_tags hold one id per
+    token, the tokens of sentence i are at sentence_offsets[i]:sentence_offsets[i + 1].
+    """
+    tokens: np.ndarray
+    fine_tags: np.ndarray
+    coarse_tags: np.ndarray
+    sentence_offsets: np.ndarray
+
+    @property
+    def sentence_count(self) -> int:
+        return len(self.sentence_offsets) - 1
+
+    def sentence(self, i: int) -> slice:
+        return slice(int(self.sentence_offsets[i]), int(self.sentence_offsets[i + 1]))
+
+
+class Interner:
+    """
+    Assigns consecutive ids to strings in the order they are first seen.
+    """
+
+    def __init__(self, values: List[str] = None):
+        self.values: List[str] = []
+        self._ids: Dict[str, int] = {}
+        for value in values or []:
+            self.id(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def id(self, value: str) -> int:
+        value_id = self._ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self._ids[value] = value_id
+            self.values.append(value)
+        return value_id
+
+
+class IobVocabulary:
+    """
+    The token texts and tags that the ids in IobArrays refer to. One vocabulary
+    is shared by all splits of a dataset.
+    """
+
+    def __init__(self, tokens: List[str] = None, fine_tags: List[str] = None, coarse_tags: List[str] = None):
+        self.tokens = Interner(tokens)
+        self.fine_tags = Interner(fine_tags)
+        self.coarse_tags = Interner(coarse_tags)
+
+    def save(self, output_dir: str):
+        content = {
+            'tokens': self.tokens.values,
+            'fine_tags': self.fine_tags.values,
+            'coarse_tags': self.coarse_tags.values
+        }
+        with open(os.path.join(output_dir, VOCABULARY_FILE_NAME), mode='w', encoding='utf-8') as f:
+            json.dump(content, f, ensure_ascii=False)
+
+    @staticmethod
+    def load(output_dir: str) -> 'IobVocabulary':
+        with open(os.path.join(output_dir, VOCABULARY_FILE_NAME), mode='r', encoding='utf-8') as f:
+            content = json.load(f)
+        return IobVocabulary(content['tokens'], content['fine_tags'], content['coarse_tags'])
+
+
+class IobArraysBuilder:
+    """
+    Collects IOB text (as written by WebAnnoIobDataTransformer) into the arrays of one split.
+    """
+
+    def __init__(self, vocabulary: IobVocabulary, delimiter: str = '\t', lineterminator: str = '\n'):
+        self.vocabulary = vocabulary
+        self.delimiter = delimiter
+        self.lineterminator = lineterminator
+        self._tokens = array('i')
+        self._fine_tags = array('i')
+        self._coarse_tags = array('i')
+        self._sentence_offsets = array('q', [0])
+
+    def add_text(self, text: str):
+        tokens, fine_tags, coarse_tags = self.vocabulary.tokens, self.vocabulary.fine_tags, self.vocabulary.coarse_tags
+        for line in text.split(self.lineterminator):
+            if line:
+                token, fine, coarse = line.rsplit(self.delimiter, 2)
+                self._tokens.append(tokens.id(token))
+                self._fine_tags.append(fine_tags.id(fine))
+                self._coarse_tags.append(coarse_tags.id(coarse))
+            elif len(self._tokens) > self._sentence_offsets[-1]:
+                self._sentence_offsets.append(len(self._tokens))
+
+    def build(self) -> IobArrays:
+        return IobArrays(
+            tokens=np.frombuffer(self._tokens, dtype=np.int32).copy(),
+            fine_tags=np.frombuffer(self._fine_tags, dtype=np.int32).copy(),
+            coarse_tags=np.frombuffer(self._coarse_tags, dtype=np.int32).copy(),
+            sentence_offsets=np.frombuffer(self._sentence_offsets, dtype=np.int64).copy()
+        )
+
+    def save(self, output_dir: str, name: str):
+        save_iob_arrays(self.build(), output_dir, name)
+
+
+def _array_path(output_dir: str, name: str, array_name: str) -> str:
+    return os.path.join(output_dir, '%s.%s.npy' % (name, array_name))
+
+
+def save_iob_arrays(arrays: IobArrays, output_dir: str, name: str):
+    """
+    Save the arrays of a split as .npy files named <name>.<array>.npy, e.g. train.tokens.npy.
+    """
+    for array_name in ARRAY_NAMES:
+        np.save(_array_path(output_dir, name, array_name), getattr(arrays, array_name))
+
+
+def load_iob_arrays(output_dir: str, name: str, mmap_mode: Optional[str] = 'r') -> IobArrays:
+    """
+    Load the arrays of a split saved by save_iob_arrays().
+
+    :param mmap_mode: passed to numpy.load(), by default the arrays are memory-mapped read-only.
+        Use None to read them into memory.
+    """
+    return IobArrays(*(np.load(_array_path(output_dir, name, array_name), mmap_mode=mmap_mode)
+                       for array_name in ARRAY_NAMES))
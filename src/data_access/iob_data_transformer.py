@@ -1,36 +1,37 @@
+import glob
+import gzip
+import hashlib
+import json
+import logging
 import os
 import random
+import re
+from contextlib import nullcontext
+from multiprocessing import Pool
 from pathlib import Path
-from typing import List
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
-from src.data_access.webanno_tsv import (NO_LABEL_ID, Annotation,
-                                         webanno_tsv_read_file)
+from src.data_access.iob_arrays import IobArraysBuilder, IobVocabulary
+from src.data_access.labels import FINE_TO_COARSE, LabelRegistry
+from src.data_access.webanno_tsv import (Document, entity_spans,
+                                         webanno_tsv_read_file,
+                                         webanno_tsv_read_labels)
 
 RANDOM_SEED = 10
 
-FINE_COARSE_NER_MAPPING = {
-                'PERmentioned' : 'PER',
-                'PERaddressee' : 'PER',
-                'PERauthor' : 'PER',
-                'PER': 'PER',
-                'DATEletter': 'DATE',
-                'DATEmentioned': 'DATE',
-                'DATErecieved': 'DATE',
-                'DATEanswered': 'DATE',
-                'DATEpoststamp': 'DATE',
-                'DATE': 'DATE',
-                'PLACEmentioned': 'PLACE',
-                'PLACEfrom': 'PLACE',
-                'PLACEto': 'PLACE',
-                'PLACE': 'PLACE',
-                'OBJtopography': 'OBJ',
-                'OBJ': 'OBJ',
-                'ORGmentioned': 'ORG',
-                'ORGaddressee': 'ORG',
-                'ORG': 'ORG',
-                'MISC': 'MISC',
-                'LIT': 'LIT'
-}
+# The number of files sent to a worker process at once when transforming in parallel
+FILES_PER_TASK = 16
+
+# Change this when the IOB output changes in a way that invalidates cached fragments
+FRAGMENT_FORMAT_VERSION = 1
+
+# Token rows of WebAnno TSV files start with "<sentence>-<token>", sub-token rows have an additional ".<n>"
+TSV_TOKEN_ROW_RE = re.compile('^[0-9]+-[0-9]+\t', re.MULTILINE)
+
+logger = logging.getLogger(__file__)
+
+# kept for existing users, the mapping lives in the label registry now
+FINE_COARSE_NER_MAPPING = FINE_TO_COARSE
 
 IOB_INSIDE = 'I-'
 IOB_OUTSIDE = 'B-'
@@ -62,6 +63,159 @@ class DataSplit:
         test_idx = int(self.test_size * len(files))
         return files[train_idx + test_idx:]
 
+    def weighted_splits(self, files: List[str], weights: List[int],
+                        groups: List[str] = None) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Split the files so that the sum of their weights (e.g. their token counts) and not their
+        number is distributed according to the split sizes. A file goes to the split that the middle
+        of its weight falls into, counted from the start of the list.
+
+        :param files: the files to split
+        :param weights: the weight of each file
+        :param groups: if given, the group of each file (e.g. its book). All files of a group are
+            put into the same split, groups are ordered by their first file.
+        :return: the train, test and dev split
+        """
+        if groups is None:
+            units = [[i] for i in range(len(files))]
+        else:
+            by_group: Dict[str, List[int]] = {}
+            for i, group in enumerate(groups):
+                by_group.setdefault(group, []).append(i)
+            units = list(by_group.values())
+
+        total = sum(weights)
+        train_end = self.train_size * total
+        test_end = (self.train_size + self.test_size) * total
+        train, test, dev = [], [], []
+        position = 0
+        for unit in units:
+            weight = sum(weights[i] for i in unit)
+            middle = position + weight / 2
+            position += weight
+            if middle < train_end:
+                split = train
+            elif middle < test_end:
+                split = test
+            else:
+                split = dev
+            split.extend(files[i] for i in unit)
+        return train, test, dev
+
+class FragmentCounts(NamedTuple):
+    reused: int
+    converted: int
+
+    def __add__(self, other: 'FragmentCounts') -> 'FragmentCounts':
+        return FragmentCounts(self.reused + other.reused, self.converted + other.converted)
+
+
+class FragmentCache:
+    """
+    Stores the IOB text converted from each source file (a fragment) in a directory.
+    Fragments are keyed by a hash of the source file's content and of the output
+    configuration, so that a fragment is only reused if converting the file again
+    would give the same text.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+    def key(self, source_file: str, config: str) -> str:
+        digest = hashlib.sha1(config.encode('utf-8'))
+        with open(source_file, mode='rb') as f:
+            digest.update(f.read())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.txt')
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            # newline='' to read back the line terminators exactly as written
+            with open(self._path(key), mode='r', encoding='utf-8', newline='') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, text: str):
+        # write to a temporary file first, so that no partial fragment is ever read
+        tmp_path = self._path(key) + '.tmp'
+        with open(tmp_path, mode='w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        os.replace(tmp_path, self._path(key))
+
+
+class ShardWriter:
+    """
+    Writes the IOB text for one split to numbered shard files of about max_tokens tokens each
+    (e.g. train-0000.txt, train-0001.txt, …), optionally gzip-compressed. Fragments are never
+    split, so every shard ends at a sentence boundary. Without max_tokens a single file with
+    the split's file name is written.
+    """
+
+    def __init__(self, output_dir: str, file_name: str, max_tokens: int = None, compress: bool = False):
+        self.output_dir = output_dir
+        self.file_name = file_name
+        self.max_tokens = max_tokens
+        self.compress = compress
+        self.shards: List[dict] = []
+        self._writer = None
+        self._remove_old_shards()
+
+    def _remove_old_shards(self):
+        stem, ext = os.path.splitext(self.file_name)
+        for pattern in [stem + '-[0-9]*' + ext, stem + '-[0-9]*' + ext + '.gz']:
+            for path in glob.glob(os.path.join(glob.escape(self.output_dir), pattern)):
+                os.remove(path)
+
+    def _shard_name(self) -> str:
+        if self.max_tokens:
+            stem, ext = os.path.splitext(self.file_name)
+            name = '%s-%04d%s' % (stem, len(self.shards), ext)
+        else:
+            name = self.file_name
+        return name + '.gz' if self.compress else name
+
+    def _open_shard(self):
+        name = self._shard_name()
+        path = os.path.abspath(os.path.join(self.output_dir, name))
+        if self.compress:
+            self._writer = gzip.open(path, mode='wt', encoding='utf-8')
+        else:
+            self._writer = open(path, mode='w', encoding='utf-8')
+        self.shards.append({'file': name, 'fragments': 0, 'sentences': 0, 'tokens': 0})
+
+    def write(self, text: str, lineterminator: str):
+        shard = self.shards[-1] if self.shards else None
+        if shard is None or (self.max_tokens and shard['tokens'] >= self.max_tokens):
+            self.close()
+            self._open_shard()
+            shard = self.shards[-1]
+        lines = text.split(lineterminator)
+        shard['fragments'] += 1
+        shard['sentences'] += lines.count('') - 1
+        shard['tokens'] += len(lines) - lines.count('')
+        self._writer.write(text)
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+    def finish(self) -> List[dict]:
+        """
+        Close the last shard, creating an empty one if nothing was written.
+
+        :return: a manifest entry for each shard with its file name and contents
+        """
+        if not self.shards:
+            self._open_shard()
+        self.close()
+        return self.shards
+
+
 class WebAnnoIobDataTransformer:
 
     def __init__(
@@ -75,7 +229,25 @@ class WebAnnoIobDataTransformer:
             iob_outside = IOB_OUTSIDE,
             delimiter: str = '\t',
             lineterminator: str = '\n',
-            coarse_ner_mapping: dict = FINE_COARSE_NER_MAPPING):
+            coarse_ner_mapping: dict = FINE_COARSE_NER_MAPPING,
+            balance_tokens: bool = False,
+            group_by_book: bool = False,
+            shard_tokens: int = None,
+            compress: bool = False,
+            manifest_file_name = 'manifest.json',
+            arrays: bool = False):
+        """
+        :param balance_tokens: split the data by token count instead of by file count
+        :param group_by_book: keep all pages of a book (files in the same directory) in the
+            same split, so that no book leaks from the training data into the test data.
+            Implies that the data is split by token count.
+        :param shard_tokens: if given, write each split to shards of about this many tokens
+        :param compress: gzip the output files
+        :param manifest_file_name: the file listing the output files of each split. It is
+            written if the output is sharded or compressed.
+        :param arrays: also save each split as NumPy arrays of token and tag ids that can be
+            memory-mapped (see iob_arrays.load_iob_arrays()), plus their shared vocabulary
+        """
         self.data_split = data_split
         self.train_file_name = train_file_name
         self.test_file_name = test_file_name
@@ -86,11 +258,20 @@ class WebAnnoIobDataTransformer:
         self.delimiter = delimiter
         self.lineterminator = lineterminator
         self.coarse_ner_mapping = coarse_ner_mapping
+        self.labels = LabelRegistry(coarse_ner_mapping)
+        self.balance_tokens = balance_tokens
+        self.group_by_book = group_by_book
+        self.shard_tokens = shard_tokens
+        self.compress = compress
+        self.manifest_file_name = manifest_file_name
+        self.arrays = arrays
 
     def transform(
             self, 
             source_path: str,
-            output_path: str):
+            output_path: str,
+            processes: int = 1,
+            cache_dir: str = None) -> FragmentCounts:
         """
         Transforms the WebAnno TSV annotations to an IOB format.
         The class configuration is used to store the output in three different
@@ -110,12 +291,71 @@ class WebAnnoIobDataTransformer:
 
         :param source_path: directory of WebAnno annotations
         :param output_path: directory of target output files
+        :param processes: if bigger than 1, files are converted in a pool of this many
+            worker processes. The output is the same as with a single process.
+        :param cache_dir: if given, the IOB text of each source file is cached in this directory
+            and only files that changed since the last run are converted again.
+        :return: how many fragments were reused from the cache and how many were converted
+        :raises UnknownLabelError: before anything is written, if any file that needs to be
+            converted has labels that are not in coarse_ner_mapping
         """
         files: List[str] = self._retrieve_randomized_files(source_path)
+        file_names = [self.train_file_name, self.test_file_name, self.dev_file_name]
+        splits = list(zip(self._split(files), file_names))
+
+        cache = FragmentCache(cache_dir) if cache_dir else None
+        fragments = [self._cached_fragments(split_files, cache) for split_files, _ in splits]
+        to_convert = [f for split_fragments in fragments for f, _, text in split_fragments if text is None]
+        self.labels.validate_files(to_convert, webanno_tsv_read_labels)
+
+        self._remove_other_outputs(output_path, file_names)
+        counts = FragmentCounts(0, 0)
+        manifest: Dict[str, List[dict]] = {}
+        vocabulary = IobVocabulary() if self.arrays else None
+        with Pool(processes) if processes > 1 else nullcontext() as pool:
+            for split_fragments, (_, file_name) in zip(fragments, splits):
+                split_counts, manifest[file_name] = self._write_data(split_fragments, output_path, file_name,
+                                                                     pool, cache, vocabulary)
+                counts += split_counts
+        if vocabulary:
+            vocabulary.save(output_path)
+        if self.shard_tokens or self.compress:
+            with open(os.path.join(output_path, self.manifest_file_name), mode='w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+        if cache:
+            logger.info('Reused %d of %d IOB fragments.' % (counts.reused, counts.reused + counts.converted))
+        return counts
+
+    def _remove_other_outputs(self, output_path: str, file_names: List[str]):
+        """
+        Remove the output files of a run with another output mode, that this run would not
+        overwrite: unsharded files with or without compression and the manifest. Shards are
+        removed by the ShardWriter.
+        """
+        stale = [] if self.shard_tokens or self.compress else [self.manifest_file_name]
+        for file_name in file_names:
+            if self.shard_tokens or self.compress:
+                stale.append(file_name)
+            if self.shard_tokens or not self.compress:
+                stale.append(file_name + '.gz')
+        for name in stale:
+            path = os.path.join(output_path, name)
+            if os.path.exists(path):
+                os.remove(path)
 
-        self._write_data(self.data_split.train_split(files), output_path, self.train_file_name)
-        self._write_data(self.data_split.test_split(files), output_path, self.test_file_name)
-        self._write_data(self.data_split.dev_split(files), output_path, self.dev_file_name)
+    def _split(self, files: List[str]) -> Tuple[List[str], List[str], List[str]]:
+        if not (self.balance_tokens or self.group_by_book):
+            return (self.data_split.train_split(files),
+                    self.data_split.test_split(files),
+                    self.data_split.dev_split(files))
+        weights = [self._count_tokens(f) for f in files]
+        groups = [os.path.dirname(f) for f in files] if self.group_by_book else None
+        return self.data_split.weighted_splits(files, weights, groups)
+
+    @staticmethod
+    def _count_tokens(path: str) -> int:
+        with open(path, mode='r', encoding='utf-8') as f:
+            return len(TSV_TOKEN_ROW_RE.findall(f.read()))
 
     def _retrieve_randomized_files(self, source_path: str) -> List[str]:
         data: List[str] = []
@@ -127,34 +367,78 @@ class WebAnnoIobDataTransformer:
         random.shuffle(data)
         return data
 
-    def _write_data(self, files: List[str], output_dir: str, file_name: str):
+    def _cached_fragments(self, files: List[str],
+                          cache: Optional[FragmentCache]) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """
+        :return: (file, fragment key, cached fragment text) for each file. Key and
+            text are None without a cache, the text also if nothing is cached yet.
+        """
+        if not cache:
+            return [(f, None, None) for f in files]
+        config = self._fragment_config()
+        keys = [cache.key(f, config) for f in files]
+        return [(f, key, cache.get(key)) for f, key in zip(files, keys)]
+
+    def _write_data(self, fragments: List[Tuple[str, Optional[str], Optional[str]]], output_dir: str,
+                    file_name: str, pool: Pool = None, cache: FragmentCache = None,
+                    vocabulary: IobVocabulary = None) -> Tuple[FragmentCounts, List[dict]]:
         Path(output_dir).mkdir(parents=True, exist_ok=True)
 
-        output_file = os.path.abspath(os.path.join(output_dir, file_name))
-        os.remove(output_file) if os.path.exists(output_file) else None
-        with open(output_file, mode='a+', encoding='utf-8') as writer:
-            for f in files:
-                prev_label_id: int = NO_LABEL_ID
-                for sentence in webanno_tsv_read_file(f).sentences:
-                    for token in sentence.tokens:
-                        writer.write(token.text)
-                        writer.write(self.delimiter)
-                        if token.annotations:
-                            if (token.annotations[0].label_id == prev_label_id and token.annotations[0].label_id != NO_LABEL_ID):
-                                self._write_annotation(writer, token.annotations[0], self.iob_inside)
-                            else:
-                                self._write_annotation(writer, token.annotations[0], self.iob_outside)
-                            prev_label_id = token.annotations[0].label_id
-                        else:
-                            writer.write(self.iob_null)
-                            writer.write(self.delimiter)
-                            writer.write(self.iob_null)
-                        writer.write(self.lineterminator)
-                    writer.write(self.lineterminator)
-
-    def _write_annotation(self, writer, annotation: Annotation, iob: str):
-        writer.write(iob)
-        writer.write(annotation.label)
-        writer.write(self.delimiter)
-        writer.write(iob)
-        writer.write(self.coarse_ner_mapping[annotation.label])
+        to_convert = [f for f, _, text in fragments if text is None]
+        if pool:
+            # imap() yields the results in the order of the files
+            converted = pool.imap(self._iob_file_text, to_convert, FILES_PER_TASK)
+        else:
+            converted = map(self._iob_file_text, to_convert)
+
+        arrays = IobArraysBuilder(vocabulary, self.delimiter, self.lineterminator) if vocabulary else None
+        writer = ShardWriter(output_dir, file_name, self.shard_tokens, self.compress)
+        try:
+            for _, key, text in fragments:
+                if text is None:
+                    text = next(converted)
+                    if cache:
+                        cache.put(key, text)
+                writer.write(text, self.lineterminator)
+                if arrays:
+                    arrays.add_text(text)
+            shards = writer.finish()
+        finally:
+            writer.close()
+        if arrays:
+            arrays.save(output_dir, os.path.splitext(file_name)[0])
+        return FragmentCounts(len(fragments) - len(to_convert), len(to_convert)), shards
+
+    def _fragment_config(self) -> str:
+        mapping = sorted(self.coarse_ner_mapping.items())
+        return repr((FRAGMENT_FORMAT_VERSION, self.iob_inside, self.iob_null, self.iob_outside,
+                     self.delimiter, self.lineterminator, mapping))
+
+    def _iob_file_text(self, path: str) -> str:
+        return self._iob_text(webanno_tsv_read_file(path))
+
+    def _iob_text(self, doc: Document) -> str:
+        """
+        Convert a document to IOB lines. A token is tagged with the entity span it belongs
+        to (see entity_spans()), as beginning (B-) at the span's first token and as inside
+        (I-) at the following ones.
+
+        :return: The IOB text for the document, one token per line, sentences separated by empty lines.
+        """
+        columns: Dict[Tuple[int, int], str] = {}
+        for span in entity_spans(doc):
+            inside = self._annotation_columns(span.label, self.iob_inside)
+            for token in span.tokens:
+                columns[(token.sentence.idx, token.idx)] = inside
+            columns[(span.tokens[0].sentence.idx, span.tokens[0].idx)] = \
+                self._annotation_columns(span.label, self.iob_outside)
+        null = self.iob_null + self.delimiter + self.iob_null
+        lines: List[str] = []
+        for sentence in doc.sentences:
+            for token in sentence.tokens:
+                lines.append(token.text + self.delimiter + columns.get((sentence.idx, token.idx), null))
+            lines.append('')
+        return ''.join(line + self.lineterminator for line in lines)
+
+    def _annotation_columns(self, label: str, iob: str) -> str:
+        return iob + label + self.delimiter + iob + self.labels.coarse(label)
@@ -0,0 +1,213 @@
+import re
+from collections import defaultdict
+from enum import Enum
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+# Maps every fine grained entity label used in the annotations to its coarse label
+FINE_TO_COARSE = {
+    'PERmentioned': 'PER',
+    'PERaddressee': 'PER',
+    'PERauthor': 'PER',
+    'PER': 'PER',
+    'DATEletter': 'DATE',
+    'DATEmentioned': 'DATE',
+    'DATErecieved': 'DATE',
+    'DATEanswered': 'DATE',
+    'DATEpoststamp': 'DATE',
+    'DATE': 'DATE',
+    'PLACEmentioned': 'PLACE',
+    'PLACEfrom': 'PLACE',
+    'PLACEto': 'PLACE',
+    'PLACE': 'PLACE',
+    'OBJtopography': 'OBJ',
+    'OBJ': 'OBJ',
+    'ORGmentioned': 'ORG',
+    'ORGaddressee': 'ORG',
+    'ORG': 'ORG',
+    'MISC': 'MISC',
+    'LIT': 'LIT'
+}
+
+# The colour that word clouds use for each coarse label
+COARSE_TO_COLOR = {
+    'PER': '#ed8311',
+    'DATE': '#ba0404',
+    'PLACE': '#40ab02',
+    'OBJ': '#0283ba',
+    'ORG': '#4c02ba',
+    'MISC': '#02a8ba',
+    'LIT': '#f0e800'
+}
+
+# The name of the book viewer's Kind for each coarse label
+COARSE_TO_KIND_NAME = {
+    'PER': 'person',
+    'DATE': 'timex',
+    'PLACE': 'location',
+    'OBJ': 'keyterm',
+    'ORG': 'keyterm',
+    'MISC': 'keyterm',
+    'LIT': 'keyterm'
+}
+
+# The number of places at which an unknown label was found that are reported per label
+MAX_REPORTED_LOCATIONS = 3
+
+
+class UnknownLabelError(KeyError):
+    """
+    Raised for labels that are not in the LabelRegistry. A KeyError, because
+    the labels were formerly looked up in a plain dict.
+    """
+
+    def __init__(self, locations: Dict[str, List[str]]):
+        self.labels = sorted(locations)
+        self.locations = locations
+        lines = []
+        for label in self.labels:
+            places = locations[label]
+            shown = ', '.join(places[:MAX_REPORTED_LOCATIONS])
+            more = ' and %d more' % (len(places) - MAX_REPORTED_LOCATIONS) if len(places) > MAX_REPORTED_LOCATIONS else ''
+            lines.append('%r (%s%s)' % (label, shown, more) if places else repr(label))
+        super().__init__('Unknown labels: ' + '; '.join(lines))
+
+    def __str__(self):
+        return self.args[0]
+
+
+class LabelRegistry:
+    """
+    Interns the known fine grained labels and precomputes their coarse label,
+    word cloud colour and book viewer kind, so that these are looked up through
+    a single dict access followed by list indexing.
+
+    Coarse labels are known labels as well (they map to themselves), so all
+    lookups accept fine or coarse labels.
+    """
+
+    def __init__(self,
+                 fine_to_coarse: Dict[str, str] = FINE_TO_COARSE,
+                 coarse_to_color: Dict[str, str] = COARSE_TO_COLOR,
+                 coarse_to_kind_name: Dict[str, str] = COARSE_TO_KIND_NAME):
+        self.fine_labels: List[str] = list(fine_to_coarse)
+        self.coarse_labels: List[str] = list(dict.fromkeys(fine_to_coarse.values()))
+        self._fine_ids: Dict[str, int] = {label: i for i, label in enumerate(self.fine_labels)}
+        coarse_ids = {label: i for i, label in enumerate(self.coarse_labels)}
+        self._coarse_ids: List[int] = [coarse_ids[fine_to_coarse[label]] for label in self.fine_labels]
+        self._colors: List[Optional[str]] = [coarse_to_color.get(label) for label in self.coarse_labels]
+        self._kind_names: List[Optional[str]] = [coarse_to_kind_name.get(label) for label in self.coarse_labels]
+
+    def __contains__(self, label: str) -> bool:
+        return label in self._fine_ids
+
+    def fine_id(self, label: str) -> int:
+        try:
+            return self._fine_ids[label]
+        except KeyError:
+            raise UnknownLabelError({label: []}) from None
+
+    def coarse_id(self, label: str) -> int:
+        return self._coarse_ids[self.fine_id(label)]
+
+    def coarse(self, label: str) -> str:
+        return self.coarse_labels[self.coarse_id(label)]
+
+    def color(self, label: str, default: str = None) -> Optional[str]:
+        fine_id = self._fine_ids.get(label)
+        if fine_id is None:
+            return default
+        return self._colors[self._coarse_ids[fine_id]] or default
+
+    def kind_name(self, label: str) -> Optional[str]:
+        return self._kind_names[self.coarse_id(label)]
+
+    def validate(self, labels_with_locations: Iterable[Tuple[str, str]]):
+        """
+        Check all labels at once and report every unknown one together with the
+        places it was found at, instead of failing at the first unknown label.
+
+        :param labels_with_locations: (label, location) pairs, e.g. a label and a file name
+        :raises UnknownLabelError: if any of the labels is unknown
+        """
+        # dicts with None values serve as ordered sets of the locations
+        unknown: Dict[str, Dict[str, None]] = defaultdict(dict)
+        for label, location in labels_with_locations:
+            if label not in self._fine_ids:
+                unknown[label][location] = None
+        if unknown:
+            raise UnknownLabelError({label: list(locations) for label, locations in unknown.items()})
+
+    def validate_files(self, paths: Iterable[str], read_labels: Callable[[str], Iterable[str]]):
+        """
+        Validate the labels of many files, e.g. with webanno_tsv_read_labels() as read_labels.
+        """
+        self.validate((label, path) for path in paths for label in read_labels(path))
+
+
+# The registry of the labels used in our annotations
+LABELS = LabelRegistry()
+
+
+class LabelKindResolver:
+    """
+    Resolves entity labels to the book viewer's kinds, e.g. for labels predicted by a NER
+    model. Labels in the registry get the kind of their coarse label, other labels that of
+    the coarse label they start with (e.g. 'PERsender'), found by a single anchored regex.
+    Each distinct label is resolved once.
+
+    Unknown labels are collected with the places they were found at instead of being
+    raised right away, so that check() can report all of them together.
+    """
+
+    def __init__(self, kinds: Type[Enum], registry: LabelRegistry = LABELS):
+        """
+        :param kinds: The enum of the kinds, with members named as the registry's kind names,
+            i.e. book_viewer_json.Kind.
+        """
+        self._kinds = kinds
+        self._registry = registry
+        prefixes = sorted((label for label in registry.coarse_labels if label in registry), key=len, reverse=True)
+        self._prefix_re = re.compile('^(?:%s)' % '|'.join(map(re.escape, prefixes))) if prefixes else None
+        self._memo: Dict[str, Optional[Enum]] = {}
+        # dicts with None values serve as ordered sets of the locations
+        self._unknown: Dict[str, Dict[str, None]] = defaultdict(dict)
+
+    def _resolve(self, label: str) -> Optional[Enum]:
+        if label not in self._registry:
+            match = self._prefix_re.match(label) if self._prefix_re else None
+            if match is None:
+                return None
+            label = match.group(0)
+        kind_name = self._registry.kind_name(label)
+        return self._kinds[kind_name] if kind_name else None
+
+    def kind(self, label: str, location: str = '') -> Optional[Enum]:
+        """
+        :param location: Where the label was found, e.g. a file name, for the report of
+            unknown labels.
+        :return: The kind of the label or None, if it is unknown.
+        """
+        try:
+            kind = self._memo[label]
+        except KeyError:
+            kind = self._memo[label] = self._resolve(label)
+        if kind is None:
+            self._unknown[label][location] = None
+        return kind
+
+    def take_unknown(self) -> Dict[str, List[str]]:
+        """
+        :return: The locations of each unknown label found since the last call, which
+            are then forgotten.
+        """
+        unknown = {label: list(locations) for label, locations in self._unknown.items()}
+        self._unknown.clear()
+        return unknown
+
+    def check(self):
+        """
+        :raises UnknownLabelError: with all unknown labels found since the last check
+        """
+        unknown = self.take_unknown()
+        if unknown:
+            raise UnknownLabelError(unknown)
@@ -0,0 +1,171 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.data_access.entity_index import EntityIndex
+from src.data_access.labels import LABELS
+from src.data_access.letters import NO_YEAR, Letters, segment_letters
+from src.data_access.map_annotations_transcriptions import find_pen_pair
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+PARQUET_FILE_NAME = 'letter_stats.parquet'
+NUMPY_FILE_NAME = 'letter_stats.npy'
+
+# The columns describing a letter, followed by one column per fine label with the number of its entities
+LETTER_COLUMNS = ['book', 'first_page', 'last_page', 'pages', 'author', 'addressee', 'year']
+
+
+def _dtype(book_width: int, person_width: int) -> np.dtype:
+    return np.dtype([('book', 'U%d' % book_width),
+                     ('first_page', np.int32),
+                     ('last_page', np.int32),
+                     ('pages', np.int32),
+                     ('author', 'U%d' % person_width),
+                     ('addressee', 'U%d' % person_width),
+                     ('year', np.int32)] +
+                    [(label, np.int32) for label in LABELS.fine_labels])
+
+
+class LetterStats:
+    """
+    A table with one row per letter: its book, first and last page, the number of pages,
+    author and addressee (GND ids, empty if unknown), year (NO_YEAR if unknown) and the
+    number of entities for each fine label. The table is a NumPy structured array, so that
+    selections are boolean masks over its columns.
+    """
+
+    def __init__(self, table: np.ndarray):
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @staticmethod
+    def build(index: EntityIndex, letters: Letters = None) -> 'LetterStats':
+        """
+        :param letters: The letters of the index, segmented if not given.
+        """
+        letters = letters or segment_letters(index)
+        books = [os.path.basename(book) for book in letters.books]
+        pairs = [find_pen_pair(book, int(year) if year != NO_YEAR else None)
+                 for book, year in zip(books, letters.years)]
+        authors = [pair.author.uid if pair else '' for pair in pairs]
+        addressees = [pair.addressee.uid if pair else '' for pair in pairs]
+
+        table = np.zeros(len(letters), dtype=_dtype(max(map(len, books), default=1),
+                                                     max(map(len, authors + addressees), default=1)))
+        table['book'] = books
+        table['author'] = authors
+        table['addressee'] = addressees
+        table['year'] = letters.years
+
+        pages = np.asarray(index.pages)
+        table['pages'] = np.bincount(letters.file_letters, minlength=len(letters))
+        table['first_page'] = np.iinfo(np.int32).max
+        np.minimum.at(table['first_page'], letters.file_letters, pages)
+        np.maximum.at(table['last_page'], letters.file_letters, pages)
+
+        # entity counts by letter and label of the index
+        row_letters = letters.file_letters[np.asarray(index.file_ids)]
+        counts = np.bincount(row_letters * len(index.labels) + np.asarray(index.label_ids),
+                             minlength=len(letters) * len(index.labels)).reshape(len(letters), len(index.labels))
+        for label_id, label in enumerate(index.labels):
+            table[LABELS.fine_labels[LABELS.fine_id(label)]] = counts[:, label_id]
+        return LetterStats(table)
+
+    def save(self, stats_dir: str) -> str:
+        """
+        Save the table as Parquet if pyarrow is installed, else as .npy file.
+
+        :return: The path of the file written.
+        """
+        os.makedirs(stats_dir, exist_ok=True)
+        if pyarrow is not None:
+            path = os.path.join(stats_dir, PARQUET_FILE_NAME)
+            columns = {name: self.table[name] for name in self.table.dtype.names}
+            pyarrow.parquet.write_table(pyarrow.table(columns), path)
+        else:
+            path = os.path.join(stats_dir, NUMPY_FILE_NAME)
+            np.save(path, self.table)
+        return path
+
+    @staticmethod
+    def exists(stats_dir: str) -> bool:
+        return (os.path.exists(os.path.join(stats_dir, PARQUET_FILE_NAME))
+                or os.path.exists(os.path.join(stats_dir, NUMPY_FILE_NAME)))
+
+    @staticmethod
+    def load(stats_dir: str) -> 'LetterStats':
+        parquet_path = os.path.join(stats_dir, PARQUET_FILE_NAME)
+        if pyarrow is not None and os.path.exists(parquet_path):
+            parquet = pyarrow.parquet.read_table(parquet_path)
+            columns = {name: parquet.column(name).to_numpy() for name in parquet.column_names}
+            table = np.zeros(parquet.num_rows, dtype=_dtype(
+                max((len(b) for b in columns['book']), default=1),
+                max((len(p) for p in np.concatenate([columns['author'], columns['addressee']])), default=1)))
+            for name in table.dtype.names:
+                table[name] = columns[name]
+            return LetterStats(table)
+        return LetterStats(np.load(os.path.join(stats_dir, NUMPY_FILE_NAME)))
+
+    def select(self, first_year: int = None, last_year: int = None, author: str = None,
+               addressee: str = None, book: str = None) -> np.ndarray:
+        """
+        :return: A boolean mask over the letters matching all of the given conditions. Letters
+            without a year are left out if a year is given.
+        """
+        mask = np.ones(len(self.table), dtype=bool)
+        if first_year is not None:
+            mask &= self.table['year'] >= first_year
+        if last_year is not None:
+            mask &= (self.table['year'] <= last_year) & (self.table['year'] != NO_YEAR)
+        if author is not None:
+            mask &= self.table['author'] == author
+        if addressee is not None:
+            mask &= self.table['addressee'] == addressee
+        if book is not None:
+            mask &= self.table['book'] == book
+        return mask
+
+    def entity_counts(self, labels: List[str] = None, mask: np.ndarray = None) -> np.ndarray:
+        """
+        :param labels: The fine or coarse labels to count the entities of, default: all.
+        :return: The number of entities with these labels per letter (of the mask).
+        """
+        columns = [label for label in LABELS.fine_labels
+                   if labels is None or label in labels or LABELS.coarse(label) in labels]
+        table = self.table if mask is None else self.table[mask]
+        counts = np.zeros(len(table), dtype=np.int64)
+        for column in columns:
+            counts += table[column]
+        return counts
+
+    def per_year(self, labels: List[str] = None, mask: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: The years with letters (of the mask) and for each the number of entities
+            with the labels or, if labels is None, the number of letters.
+        """
+        mask = self.select(first_year=NO_YEAR + 1) & (True if mask is None else mask)
+        years = self.table['year'][mask]
+        weights = None if labels is None else self.entity_counts(labels, mask)
+        unique, inverse = np.unique(years, return_inverse=True)
+        return unique, np.bincount(inverse, weights=weights, minlength=len(unique)).astype(np.int64)
+
+    def per_pair(self, labels: List[str] = None, mask: np.ndarray = None) -> Dict[Tuple[str, str], int]:
+        """
+        :return: For each (author, addressee) pair of the letters (of the mask) the number of
+            entities with the labels or, if labels is None, the number of letters.
+        """
+        mask = np.ones(len(self.table), dtype=bool) if mask is None else mask
+        table = self.table[mask]
+        weights = np.ones(len(table), dtype=np.int64) if labels is None else self.entity_counts(labels, mask)
+        pairs, inverse = np.unique(np.stack([table['author'], table['addressee']], axis=1), axis=0,
+                                   return_inverse=True)
+        totals = np.bincount(inverse.ravel(), weights=weights, minlength=len(pairs))
+        return {(str(author), str(addressee)): int(total) for (author, addressee), total in zip(pairs, totals)}
@@ -0,0 +1,106 @@
+import re
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from src.data_access.entity_index import EntityIndex
+from src.data_access.webanno_tsv import NO_PAGE
+
+# A four digit year of the correspondence within a letter date like '18. Dezember 1837'
+YEAR_RE = re.compile(r'(?<![0-9])(1[78][0-9]{2})(?![0-9])')
+# Headers are compared without the spaces and punctuation that vary between pages
+HEADER_NOISE_RE = re.compile(r'[\W_]+')
+NO_YEAR = -1
+
+LETTER_DATE_LABEL = 'DATEletter'
+AUTHOR_LABEL = 'PERauthor'
+
+
+class Letters(NamedTuple):
+    """
+    The letters of an entity index. Letter ids are ordered by book and page.
+    """
+    file_letters: np.ndarray  # the letter id of each file of the index
+    years: np.ndarray  # the year of each letter or NO_YEAR
+    books: List[str]  # the book of each letter
+    first_files: np.ndarray  # the file id of each letter's first page
+
+    def __len__(self) -> int:
+        return len(self.years)
+
+
+def parse_year(date: str) -> int:
+    match = YEAR_RE.search(date)
+    return int(match.group(1)) if match else NO_YEAR
+
+
+def _header(index: EntityIndex, file_id: int) -> Optional[tuple]:
+    """
+    The edition's page header is the first sentence of a page and names author,
+    addressee, place and date of the letter the page belongs to.
+
+    :return: The author and date texts of the page header, without spaces and punctuation,
+        None if it has no date.
+    """
+    start, stop = index.file_offsets[file_id], index.file_offsets[file_id + 1]
+    if start == stop:
+        return None
+    first_sentence = index.sentences[start]
+    author, date = None, None
+    for row in range(start, stop):
+        if index.sentences[row] != first_sentence:
+            break
+        label = index.labels[index.label_ids[row]]
+        if label == AUTHOR_LABEL and author is None:
+            author = index.texts.values[index.text_ids[row]]
+        elif label == LETTER_DATE_LABEL and date is None:
+            date = index.texts.values[index.text_ids[row]]
+    if date is None:
+        return None
+    return HEADER_NOISE_RE.sub('', author or ''), HEADER_NOISE_RE.sub('', date)
+
+
+def segment_letters(index: EntityIndex) -> Letters:
+    """
+    Group the pages of each book into letters. This is a heuristic based on the
+    page headers: consecutive pages with the same header author and date belong
+    to the same letter, a page without a dated header continues the previous one.
+
+    The year of a letter is taken from its header date, if that has none from any
+    other letter date in the letter and lastly from the previous letter of the book,
+    as the letters in a book are in chronological order.
+    """
+    order = sorted(range(len(index.files)), key=lambda f: (index.books[f], index.pages[f] == NO_PAGE,
+                                                          index.pages[f], index.files[f]))
+    file_letters = np.zeros(len(index.files), dtype=np.int32)
+    years: List[int] = []
+    books: List[str] = []
+    first_files: List[int] = []
+    previous_book, previous_header = None, None
+    for file_id in order:
+        book = index.books[file_id]
+        header = _header(index, file_id)
+        if book != previous_book or (header is not None and header != previous_header):
+            years.append(parse_year(header[1]) if header else NO_YEAR)
+            books.append(book)
+            first_files.append(file_id)
+            previous_book = book
+        if header is not None:
+            previous_header = header
+        file_letters[file_id] = len(years) - 1
+
+    letter_years = np.array(years, dtype=np.int32)
+    _years_from_letter_dates(index, file_letters, letter_years)
+    for letter in range(1, len(letter_years)):
+        if letter_years[letter] == NO_YEAR and books[letter] == books[letter - 1]:
+            letter_years[letter] = letter_years[letter - 1]
+    return Letters(file_letters, letter_years, books, np.array(first_files, dtype=np.int32))
+
+
+def _years_from_letter_dates(index: EntityIndex, file_letters: np.ndarray, letter_years: np.ndarray):
+    date_labels = [label_id for label_id, label in enumerate(index.labels) if label == LETTER_DATE_LABEL]
+    rows = np.flatnonzero(np.isin(index.label_ids, date_labels))
+    for row in rows:
+        letter = file_letters[index.file_ids[row]]
+        if letter_years[letter] == NO_YEAR:
+            letter_years[letter] = parse_year(index.texts.values[index.text_ids[row]])
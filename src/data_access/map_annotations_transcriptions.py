@@ -187,3 +187,17 @@ def find_transcription(author_id: str, adressee_id: str, year: Optional[int] = N
 def find_transcription_zenon_id(author_id: str, adressee_id: str, year: Optional[int] = None) -> str:
     transcription = find_transcription(author_id, adressee_id, year)
     return transcription.zenon_id if transcription else ''
+
+
+def find_pen_pair(zenon_id: str, year: Optional[int] = None) -> Optional[PenPair]:
+    """
+    The pair of correspondents of a letter in the transcription with the zenon id. This is the
+    transcription's only pair or else the only pair whose years contain the letter's year.
+    """
+    transcription = next((t for t in transcriptions if t.zenon_id == zenon_id), None)
+    if transcription is None:
+        return None
+    if len(transcription.pairs) == 1:
+        return transcription.pairs[0]
+    fitting = [p for p in transcription.pairs if p.years and year in p.years]
+    return fitting[0] if len(fitting) == 1 else None
@@ -0,0 +1,230 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from src.data_access.labels import LABELS
+
+CACHE_FORMAT_VERSION = 1
+
+# Hyphens left over from line breaks within words, e.g. 'Gerh- ard' or 'Gerh¬ard'
+HYPHENATION_RE = re.compile(r'(?<=\w)\s*[-¬]\s*(?=\w)')
+# Spaces that OCR puts around punctuation in dates, e.g. '12 . 1 . 1835'
+DATE_SPACING_RE = re.compile(r'\s*([./,])\s*')
+EDGE_PUNCTUATION_RE = re.compile(r'^\W+|\W+$')
+
+# Folding of historical and variant spellings, applied in this order to lower-cased text
+ORTHOGRAPHY_FOLDINGS = [
+    (re.compile('ß'), 'ss'),
+    (re.compile('ä'), 'ae'),
+    (re.compile('ö'), 'oe'),
+    (re.compile('ü'), 'ue'),
+    (re.compile('æ'), 'ae'),
+    (re.compile('œ'), 'oe'),
+    (re.compile('th'), 't'),
+    (re.compile('(?<=[ae])y'), 'i'),
+    (re.compile('c(?=[aou])'), 'k'),
+]
+
+# Entities with these coarse labels are not folded orthographically and not clustered
+DATE_LABELS = ['DATE']
+# Keys shorter than this are not clustered, as few characters are too similar by chance
+MIN_CLUSTER_KEY_LENGTH = 5
+
+
+def _coarse(label: Optional[str]) -> str:
+    return LABELS.coarse(label) if label in LABELS else (label or '')
+
+
+@lru_cache(maxsize=None)
+def canonical(text: str, label: str = None) -> str:
+    """
+    The key under which variants of an entity text are counted together: NFKC normalized
+    (which also maps the long s to s), lower-cased, without hyphenation leftovers and
+    punctuation at the edges. Except for dates, historical spellings and diacritics are
+    folded as well, e.g. 'Thal' and 'Tal' or 'Müller' and 'Mueller' get the same key.
+
+    :param label: The fine or coarse label of the entity.
+    """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = ' '.join(text.split())
+    if _coarse(label) in DATE_LABELS:
+        return DATE_SPACING_RE.sub(r'\1', text).strip()
+    text = HYPHENATION_RE.sub('', text)
+    for pattern, replacement in ORTHOGRAPHY_FOLDINGS:
+        text = pattern.sub(replacement, text)
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return EDGE_PUNCTUATION_RE.sub('', text) or text
+
+
+def trigrams(key: str) -> List[str]:
+    padded = '  ' + key + ' '
+    return sorted({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b)
+
+
+def _prefix_length(size: int, similarity: float) -> int:
+    # two sets with a jaccard similarity of at least similarity share an element in their
+    # prefixes of this length, if both are ordered the same way
+    return size - int(math.ceil(similarity * size - 1e-9)) + 1
+
+
+def cluster_keys(key_counts: Dict[str, int], similarity: float) -> Dict[str, str]:
+    """
+    Cluster keys whose trigram sets have a jaccard similarity of at least similarity.
+    Keys are visited from the most to the least frequent, a key joins the most similar
+    cluster found or starts a new one. Candidate clusters are looked up in an index of
+    the rarest trigrams of each cluster's first key (prefix filtering), so that keys
+    are only compared if they can reach the similarity.
+
+    :return: The first key of its cluster for each key.
+    """
+    grams = {key: trigrams(key) for key in key_counts}
+    frequency: Dict[str, int] = defaultdict(int)
+    for key_grams in grams.values():
+        for gram in key_grams:
+            frequency[gram] += 1
+    # the global order of trigrams for prefix filtering: rare ones first
+    for key_grams in grams.values():
+        key_grams.sort(key=lambda gram: (frequency[gram], gram))
+
+    heads: Dict[str, str] = {}
+    index: Dict[str, List[str]] = defaultdict(list)
+    for key in sorted(key_counts, key=lambda k: (-key_counts[k], k)):
+        key_grams = grams[key]
+        key_set = set(key_grams)
+        best, best_similarity = key, similarity
+        candidates = {head for gram in key_grams[:_prefix_length(len(key_grams), similarity)] for head in index[gram]}
+        for head in sorted(candidates):
+            head_grams = grams[head]
+            # the jaccard similarity is at most the ratio of the set sizes
+            if min(len(head_grams), len(key_grams)) < similarity * max(len(head_grams), len(key_grams)):
+                continue
+            head_similarity = jaccard(key_set, set(head_grams))
+            if head_similarity >= best_similarity and (best == key or head_similarity > best_similarity):
+                best, best_similarity = head, head_similarity
+        heads[key] = best
+        if best == key:
+            for gram in key_grams[:_prefix_length(len(key_grams), similarity)]:
+                index[gram].append(key)
+    return heads
+
+
+class EntityNormalizer:
+    """
+    Merges the variants of entity texts in word cloud frequencies under their canonical()
+    key and, if a similarity is given, additionally clusters similar keys of the same
+    coarse label (see cluster_keys()). Merged entities are shown as their most frequent
+    variant.
+
+    Canonical keys and clusters are cached and, if a cache path is given, saved there, so
+    that each distinct text is normalized and clustered once across runs.
+    """
+
+    def __init__(self, cache_path: str = None, similarity: float = None):
+        self.cache_path = cache_path
+        self.similarity = similarity
+        # (text, coarse label) -> key
+        self._keys: Dict[Tuple[str, str], str] = {}
+        # (key, coarse label) -> first key of the cluster
+        self._clusters: Dict[Tuple[str, str], str] = {}
+        self._changed = False
+        if cache_path and os.path.exists(cache_path):
+            self._load()
+
+    def _load(self):
+        with open(self.cache_path, mode='r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('version') != CACHE_FORMAT_VERSION:
+            return
+        self._keys = {(text, label): key for text, label, key in cache['keys']}
+        if cache.get('similarity') == self.similarity:
+            self._clusters = {(key, label): head for key, label, head in cache['clusters']}
+
+    def save(self):
+        """
+        Write the cache if a cache path is given and anything was added since loading.
+        """
+        if not self.cache_path or not self._changed:
+            return
+        cache = {
+            'version': CACHE_FORMAT_VERSION,
+            'similarity': self.similarity,
+            'keys': [[text, label, key] for (text, label), key in self._keys.items()],
+            'clusters': [[key, label, head] for (key, label), head in self._clusters.items()]
+        }
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, mode='w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+        self._changed = False
+
+    def key(self, text: str, label: str = None) -> str:
+        """
+        The canonical key of the text, with its cluster's key if clustered before.
+        """
+        coarse = _coarse(label)
+        key = self._keys.get((text, coarse))
+        if key is None:
+            key = canonical(text, coarse)
+            self._keys[(text, coarse)] = key
+            self._changed = True
+        return self._clusters.get((key, coarse), key)
+
+    def _cluster(self, key_counts: Dict[Tuple[str, str], int]):
+        by_label: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for (key, label), count in key_counts.items():
+            if label not in DATE_LABELS and len(key) >= MIN_CLUSTER_KEY_LENGTH:
+                by_label[label][key] = count
+        for label, counts in by_label.items():
+            # keys clustered before keep their cluster, new keys may join those clusters
+            new = [key for key in counts if (key, label) not in self._clusters]
+            if not new:
+                continue
+            for key, head in cluster_keys(counts, self.similarity).items():
+                if (key, label) not in self._clusters:
+                    self._clusters[(key, label)] = self._clusters.get((head, label), head)
+            self._changed = True
+
+    def merge(self, text_with_frequencies: dict, text_annotations: dict) -> Tuple[dict, dict]:
+        """
+        Merge the frequencies of variants of the same entity.
+
+        :param text_with_frequencies: The frequency of each text.
+        :param text_annotations: The (coarse) label of each text.
+        :return: Frequencies and labels as given, with each merged entity under its most
+            frequent text, in order of the first text of each merged entity.
+        """
+        keys = {text: (self.key(text, text_annotations[text]), _coarse(text_annotations[text]))
+                for text in text_with_frequencies}
+        if self.similarity is not None:
+            key_counts: Dict[Tuple[str, str], int] = defaultdict(int)
+            for text, frequency in text_with_frequencies.items():
+                key_counts[keys[text]] += frequency
+            self._cluster(key_counts)
+            keys = {text: (self._clusters.get(key, key[0]), key[1]) for text, key in keys.items()}
+
+        totals: Dict[Tuple[str, str], int] = defaultdict(int)
+        shown: Dict[Tuple[str, str], str] = {}
+        for text, frequency in text_with_frequencies.items():
+            key = keys[text]
+            totals[key] += frequency
+            if key not in shown or frequency > text_with_frequencies[shown[key]]:
+                shown[key] = text
+        merged_frequencies = {}
+        merged_annotations = {}
+        for key, text in shown.items():
+            # two entities shown with the same text but different labels stay apart in the labels only
+            merged_frequencies[text] = merged_frequencies.get(text, 0) + totals[key]
+            merged_annotations[text] = text_annotations[text]
+        return merged_frequencies, merged_annotations
@@ -0,0 +1,53 @@
+import mmap
+import os
+from typing import Iterator, Tuple
+
+# Pages in the OCR text files are separated by form feeds
+PAGE_SEP = '\f'
+_PAGE_SEP_BYTE = PAGE_SEP.encode('utf-8')
+
+
+def _decode(data: bytes) -> str:
+    # normalize line endings the same way as reading the file in text mode does
+    return data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def read_pages(path: str) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily read the pages of an OCR text file. The file is memory-mapped and scanned
+    for page separators, so that only the current page is held in memory as a string.
+    The pages are the same as those of splitting the file's content on PAGE_SEP.
+
+    :param path: The OCR text file to read.
+    :return: An iterator of (page_no, text) tuples with pages counted from 1.
+    """
+    with open(path, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield 1, ''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            page_no = 1
+            end = data.find(_PAGE_SEP_BYTE, start)
+            while end >= 0:
+                yield page_no, _decode(data[start:end])
+                start = end + len(_PAGE_SEP_BYTE)
+                page_no += 1
+                end = data.find(_PAGE_SEP_BYTE, start)
+            yield page_no, _decode(data[start:])
+
+
+def count_pages(path: str) -> int:
+    """
+    Return the number of pages that read_pages() yields for path, without decoding them.
+    """
+    with open(path, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 1
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            count = 1
+            end = data.find(_PAGE_SEP_BYTE)
+            while end >= 0:
+                count += 1
+                end = data.find(_PAGE_SEP_BYTE, end + 1)
+            return count
@@ -0,0 +1,135 @@
+import difflib
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+NO_TOKEN_ID = -1
+
+# Candidate lengths relative to the needle length that are tried by inexact matches
+INEXACT_LENGTH_OFFSETS = [-2, -1, 0, 1, 2, 3]
+
+
+class Match(NamedTuple):
+    start: int
+    stop: int
+    score: float
+
+
+class FuzzyScorer:
+    """
+    Scores candidate strings against a needle the same way that difflib.get_close_matches()
+    does, but remembers every ratio (or upper bound for it) that was computed, so that
+    repeated lookups with different cutoffs do not redo the work.
+    """
+
+    def __init__(self, needle: Sequence[str]):
+        self.needle_length = len(needle)
+        self._matcher = difflib.SequenceMatcher()
+        self._matcher.set_seq2(''.join(needle))
+        self._ratios: Dict[str, float] = {}
+        self._upper_bounds: Dict[str, float] = {}
+
+    def score(self, candidate: str, cutoff: float) -> Optional[float]:
+        """
+        Return the similarity ratio of candidate and the needle or None if it is below cutoff.
+        """
+        ratio = self._ratios.get(candidate)
+        if ratio is None:
+            bound = self._upper_bounds.get(candidate)
+            if bound is not None and bound < cutoff:
+                return None
+            self._matcher.set_seq1(candidate)
+            for upper_bound in (self._matcher.real_quick_ratio, self._matcher.quick_ratio):
+                bound = upper_bound()
+                if bound < cutoff:
+                    self._upper_bounds[candidate] = bound
+                    return None
+            ratio = self._matcher.ratio()
+            self._ratios[candidate] = ratio
+        return ratio if ratio >= cutoff else None
+
+
+class TokenMatcher:
+    """
+    Encodes the token texts of a page once, so that exact and inexact matches of token
+    sequences can be looked up in arbitrary windows of the page without re-slicing the tokens.
+
+    Windows are given as start and stop indices with the semantics of a python slice.
+    Matches are returned as token indices into the page.
+    """
+
+    def __init__(self, texts: Sequence[str]):
+        self._vocabulary: Dict[str, int] = {}
+        self.ids = np.array([self._vocabulary.setdefault(t, len(self._vocabulary)) for t in texts], dtype=np.int32)
+        self._joined = ''.join(texts)
+        self._offsets: List[int] = [0]
+        for text in texts:
+            self._offsets.append(self._offsets[-1] + len(text))
+        self._occurrences: Dict[Tuple[int, ...], np.ndarray] = {}
+        self._candidates: Dict[Tuple[int, int], str] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _window(self, start: int, stop: int) -> Tuple[int, int]:
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return start, max(start, stop)
+
+    def encode(self, texts: Sequence[str]) -> Tuple[int, ...]:
+        return tuple(self._vocabulary.get(t, NO_TOKEN_ID) for t in texts)
+
+    def occurrences(self, needle: Sequence[str]) -> np.ndarray:
+        """
+        Return the sorted start indices of all exact matches of needle in the page.
+        """
+        key = self.encode(needle)
+        if key not in self._occurrences:
+            if len(key) == 0 or len(key) > len(self) or NO_TOKEN_ID in key:
+                positions = np.empty(0, dtype=np.intp)
+            else:
+                positions = np.flatnonzero(self.ids[:len(self) - len(key) + 1] == key[0])
+                for offset in range(1, len(key)):
+                    positions = positions[self.ids[positions + offset] == key[offset]]
+            self._occurrences[key] = positions
+        return self._occurrences[key]
+
+    def text(self, start: int, stop: int) -> str:
+        """
+        Return the token texts between start and stop joined without whitespace.
+        """
+        key = (start, stop)
+        if key not in self._candidates:
+            self._candidates[key] = self._joined[self._offsets[start]:self._offsets[stop]]
+        return self._candidates[key]
+
+    def exact_match(self, needle: Sequence[str], start: int, stop: int) -> Optional[Match]:
+        """
+        Return the first exact match of needle that lies completely in the window.
+        """
+        start, stop = self._window(start, stop)
+        positions = self.occurrences(needle)
+        idx = np.searchsorted(positions, start)
+        if idx < len(positions) and positions[idx] + len(needle) <= stop:
+            match_start = int(positions[idx])
+            return Match(match_start, match_start + len(needle), 1.0)
+        return None
+
+    def inexact_match(self, scorer: FuzzyScorer, start: int, stop: int, cutoff: float) -> Optional[Match]:
+        """
+        Return the token sequence in the window that is the closest match for the scorer's
+        needle. Candidates are all sequences a little shorter or longer than the needle.
+        The result is the same that difflib.get_close_matches() would give for the candidates.
+        """
+        start, stop = self._window(start, stop)
+        best: Optional[Tuple[float, str]] = None
+        result = None
+        for length in (scorer.needle_length + offset for offset in INEXACT_LENGTH_OFFSETS):
+            if length <= 0:
+                continue
+            for match_start in range(start, stop - length + 1):
+                candidate = self.text(match_start, match_start + length)
+                score = scorer.score(candidate, cutoff)
+                if score is not None and (best is None or (score, candidate) > best):
+                    best = (score, candidate)
+                    result = Match(match_start, match_start + length, score)
+        return result
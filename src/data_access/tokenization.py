@@ -0,0 +1,77 @@
+import os
+from functools import lru_cache
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List
+
+from nltk.data import load as nltk_load
+from nltk.tokenize import NLTKWordTokenizer
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+
+RESOURCE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'resources')
+SENTENCE_TOKENIZER_PICKLE = os.path.join(RESOURCE_DIR, 'dai_german_punkt.pickle')
+
+# The language of the punkt model that nltk's word_tokenize() uses to split its input
+WORD_TOKENIZER_LANGUAGE = 'german'
+
+_word_tokenizer = NLTKWordTokenizer()
+
+
+@lru_cache(maxsize=None)
+def sentence_tokenizer() -> PunktSentenceTokenizer:
+    """
+    Return the sentence tokenizer trained on our texts, loading it on first use.
+    """
+    return nltk_load(SENTENCE_TOKENIZER_PICKLE)
+
+
+@lru_cache(maxsize=None)
+def _word_tokenizer_punkt() -> PunktSentenceTokenizer:
+    return nltk_load('tokenizers/punkt/%s.pickle' % WORD_TOKENIZER_LANGUAGE)
+
+
+def split_sentences(text: str) -> List[str]:
+    return sentence_tokenizer().tokenize(text, realign_boundaries=True)
+
+
+def tokenize_words(sentence: str) -> List[str]:
+    """
+    Split a sentence into words. The result is the same as that of
+    nltk.tokenize.word_tokenize(sentence, 'german'), but the punkt model
+    is not looked up again for every sentence.
+    """
+    parts = _word_tokenizer_punkt().tokenize(sentence)
+    return [word for part in parts for word in _word_tokenizer.tokenize(part)]
+
+
+def tokenize_page(text: str) -> List[List[str]]:
+    """
+    Split a text into sentences and those into words.
+
+    :param text: The text to tokenize.
+    :return: A list of sentences, each a list of words.
+    """
+    return [tokenize_words(sentence) for sentence in split_sentences(text)]
+
+
+def tokenize_pages(texts: Iterable[str], processes: int = 1, chunksize: int = 8) -> List[List[List[str]]]:
+    """
+    Tokenize many texts (e.g. the pages of a book) with tokenize_page() in one call.
+
+    :param texts: The texts to tokenize.
+    :param processes: If bigger than 1, tokenize in a pool of this many worker processes.
+    :param chunksize: The number of texts sent to a worker process at once.
+    :return: A list with the result of tokenize_page() for each text, in input order.
+    """
+    return list(iter_tokenize_pages(texts, processes, chunksize))
+
+
+def iter_tokenize_pages(texts: Iterable[str], processes: int = 1, chunksize: int = 8) -> Iterator[List[List[str]]]:
+    """
+    Like tokenize_pages(), but yield the results one at a time instead of
+    collecting them in a list.
+    """
+    if processes <= 1:
+        yield from (tokenize_page(text) for text in texts)
+    else:
+        with Pool(processes) as pool:
+            yield from pool.imap(tokenize_page, texts, chunksize)
@@ -1,9 +1,10 @@
 import csv
 import logging
+import os
 import re
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 
 NO_LABEL_ID = -1
 COMMENT_RE = re.compile('^#')
@@ -12,6 +13,8 @@ SENTENCE_RE = re.compile('^#Text=(.*)')
 FIELD_EMPTY_RE = re.compile('^[_*]')
 FIELD_WITH_ID_RE = re.compile(r'(.*)\[([0-9]*)]$')
 SUB_TOKEN_RE = re.compile(r'[0-9]+-[0-9]+\.[0-9]+')
+PAGE_NUMBER_RE = re.compile('_page([0-9]+)[^_]*$')
+NO_PAGE = -1
 
 HEADERS = ['#FORMAT=WebAnno TSV 3.1']
 
@@ -240,8 +243,13 @@ class Document:
         sentence.doc = self
         self.sentences.append(sentence)
 
-    def add_annotation(self, annotation: Annotation):
-        merged = False
+    def add_annotation(self, annotation: Annotation) -> Annotation:
+        """
+        Add the annotation to this document or merge it with an existing annotation
+        of the same type and label id.
+
+        :return: The annotation in this document that now holds the annotation's tokens.
+        """
         type_name = self._anno_type(annotation.layer_name, annotation.field_name)
         # check if we should merge with an existing annotation
         if annotation.label_id != NO_LABEL_ID:
@@ -250,10 +258,10 @@ class Document:
             assert (len(same_id)) <= 1
             if len(same_id) > 0:
                 same_id[0].merge_other(annotation)
-                merged = True
-        if not merged:
-            assert (annotation.doc == self)
-            self._annotations[type_name].append(annotation)
+                return same_id[0]
+        assert (annotation.doc == self)
+        self._annotations[type_name].append(annotation)
+        return annotation
 
     def remove_annotation(self, annotation: Annotation):
         type_name = self._anno_type(annotation.layer_name, annotation.field_name)
@@ -268,6 +276,114 @@ class Document:
         return self._annotations[type_name]
 
 
+class SpanIndex:
+    """
+    Positions of a document's tokens and of the annotations of one layer and field on
+    those tokens. This allows to look up annotations in the neighbourhood of tokens
+    without scanning all of the document's annotations. If no layer and field are given,
+    all of the document's annotations are indexed, so that annotations_at() gives the
+    same annotations in the same order as Token.annotations.
+
+    Annotations of that type that are added to or removed from the document afterwards
+    have to be added to or removed from the index as well.
+    """
+
+    def __init__(self, doc: Document, layer_name: str = None, field_name: str = None):
+        self.layer_name = layer_name
+        self.field_name = field_name
+        self.tokens = doc.tokens
+        self._positions = {(t.sentence.idx, t.idx): i for i, t in enumerate(self.tokens)}
+        self._annotations_at: List[List[Annotation]] = [[] for _ in self.tokens]
+        if layer_name is None:
+            annotations = doc.annotations
+        else:
+            annotations = doc.annotations_with_type(layer_name, field_name)
+        for annotation in annotations:
+            self.add(annotation)
+
+    def position(self, token: Token) -> int:
+        return self._positions[(token.sentence.idx, token.idx)]
+
+    def annotations_at(self, position: int) -> List[Annotation]:
+        return list(self._annotations_at[position])
+
+    def annotations_on(self, tokens: List[Token]) -> List[Annotation]:
+        """
+        Return the distinct annotations present on any of the tokens in order of appearance.
+        """
+        result = []
+        for token in tokens:
+            for annotation in self._annotations_at[self.position(token)]:
+                if annotation not in result:
+                    result.append(annotation)
+        return result
+
+    def add(self, annotation: Annotation):
+        for token in annotation.tokens:
+            at_position = self._annotations_at[self.position(token)]
+            if annotation not in at_position:
+                at_position.append(annotation)
+
+    def remove(self, annotation: Annotation):
+        for token in annotation.tokens:
+            self._annotations_at[self.position(token)].remove(annotation)
+
+
+class EntitySpan(NamedTuple):
+    text: str
+    label: str
+    book: str  # the name of the directory that the document was read from
+    page: int  # the page number from the document's file name or NO_PAGE
+    sentence: int  # the idx of the sentence the span starts in
+    tokens: List[Token]
+
+
+def parse_page_number(path: str, strict: bool = False) -> int:
+    """
+    :return: The page number from a file name like '000880098_page012.tsv' or NO_PAGE.
+    :raises ValueError: if strict and the file name has no page number
+    """
+    match = PAGE_NUMBER_RE.search(os.path.splitext(os.path.basename(path))[0])
+    if match:
+        return int(match.group(1))
+    if strict:
+        raise ValueError('No page number in file name: %s' % path)
+    return NO_PAGE
+
+
+def entity_spans(doc: Document, layer_name: str = None, field_name: str = None) -> Iterator[EntitySpan]:
+    """
+    Yield the entities of a document in document order. A token belongs to the first
+    annotation present on it, as in Token.annotations, and consecutive annotated tokens
+    belonging to the same annotation form an entity. Only the annotations' tokens are
+    visited, not those of the whole document.
+
+    :param layer_name: If given, only annotations of this layer and field_name are used.
+    """
+    if layer_name is None:
+        annotations = doc.annotations
+    else:
+        annotations = doc.annotations_with_type(layer_name, field_name)
+    owners: Dict[Tuple[int, int], Tuple[Token, Annotation]] = {}
+    for annotation in annotations:
+        for token in annotation._tokens:
+            owners.setdefault((token.sentence.idx, token.idx), (token, annotation))
+
+    book = os.path.basename(os.path.dirname(doc.path))
+    page = parse_page_number(doc.path)
+    tokens: List[Token] = []
+    previous: Optional[Annotation] = None
+    for position in sorted(owners):
+        token, annotation = owners[position]
+        if annotation is not previous and tokens:
+            yield EntitySpan(' '.join(t.text for t in tokens), previous.label, book, page, tokens[0].sentence.idx, tokens)
+            tokens = []
+        tokens.append(token)
+        previous = annotation
+    if tokens:
+        yield EntitySpan(' '.join(t.text for t in tokens), previous.label, book, page, tokens[0].sentence.idx, tokens)
+
+
 def _unescape(text: str) -> str:
     for s in RESERVED_STRS:
         text = text.replace('\\' + s, s)
@@ -416,6 +532,52 @@ def webanno_tsv_read_file(path: str, overriding_layer_names: List[Tuple[str, Lis
     return doc
 
 
+def webanno_tsv_read_text(path: str) -> str:
+    """
+    Read only the text of the tsv file at path, i.e. the text of the Document
+    that webanno_tsv_read_file() would return, without parsing tokens and annotations.
+
+    :param path: Path to read.
+    :return: The sentences of the file at path joined by newlines.
+    """
+    with open(path, mode='r', encoding='utf-8') as f:
+        lines = f.readlines()
+    return '\n'.join(_filter_sentences(lines))
+
+
+def webanno_tsv_read_labels(path: str, layer_name: str = None, field_name: str = None) -> List[str]:
+    """
+    Read only the annotation labels of the tsv file at path, without building a Document.
+    A label is returned once for every token that it is present on.
+
+    :param path: Path to read.
+    :param layer_name: If given, only read labels of this layer.
+    :param field_name: If given, only read labels of this field.
+    :return: The non-empty labels in the order they appear in the file.
+    """
+    with open(path, mode='r', encoding='utf-8') as f:
+        lines = f.readlines()
+    span_columns = [(layer, field) for layer, fields in _read_span_layer_names(lines) for field in fields]
+    columns = [len(TOKEN_FIELDNAMES) + i for i, (layer, field) in enumerate(span_columns)
+               if (layer_name is None or layer == layer_name) and (field_name is None or field == field_name)]
+    labels = []
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        row = line.rstrip('\r\n').split('\t')
+        # skip empty lines and sub-token rows (e.g. "1-2.1")
+        if len(row) <= len(TOKEN_FIELDNAMES) or '.' in row[0]:
+            continue
+        for column in columns:
+            # most fields are placeholders, skip those without looking at them further
+            if column < len(row) and row[column][:1] not in ('_', '*', ''):
+                for value in row[column].split('|'):
+                    label, _ = _read_label_and_id(value)
+                    if label != '':
+                        labels.append(label)
+    return labels
+
+
 def _write_span_layer_header(layer_name: str, layer_fields: List[str]) -> str:
     """
     Example:
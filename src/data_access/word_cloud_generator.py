@@ -1,59 +1,123 @@
 import os
+from contextlib import nullcontext
 from enum import Enum
-from typing import Callable, List
+from functools import lru_cache
+from multiprocessing import Pool
+from operator import itemgetter
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
 
-import matplotlib.pyplot as plt
 import numpy as np
-from src.data_access.iob_data_transformer import FINE_COARSE_NER_MAPPING
-from src.data_access.webanno_tsv import (NO_LABEL_ID, Token,
-                                         webanno_tsv_read_file)
+from src.data_access.entity_index import EntityIndex, normalize_text
+from src.data_access.labels import COARSE_TO_COLOR, LABELS
+from src.data_access.normalization import EntityNormalizer
 from wordcloud import WordCloud
 
+# The width and height of the word clouds
+CLOUD_SIZE = 1000
+MAX_WORDS = 100
+
 
 class Operator(Enum):
     OR = 1
     AND = 2
 
+
+class WordCloudJob(NamedTuple):
+    """
+    A word cloud of a batch: the co-occurrences of word_entities (see
+    WordCloudGenerator.extract_coocurrences()) or, if that is None, the
+    total data, filtered as in WordCloudGenerator.generate().
+    """
+    output_path: str
+    word_entities: Optional[dict] = None
+    entity_only: bool = True
+    operator: Operator = Operator.OR
+    relation_entity_types: Optional[List[str]] = None
+    exclude_entities: Sequence[str] = ()
+    exclude_entity_types: Sequence[str] = ()
+
+
+@lru_cache(maxsize=None)
+def circle_mask(size: int = CLOUD_SIZE) -> np.ndarray:
+    """
+    A read-only mask that is 255 outside of the circle filling the image,
+    where WordCloud places no words.
+    """
+    x, y = np.ogrid[:size, :size]
+    radius = size // 2
+    mask = np.where((x - radius) ** 2 + (y - radius) ** 2 > radius ** 2, 255, 0).astype(np.uint8)
+    mask.setflags(write=False)
+    return mask
+
+
+def top_words(text_with_frequencies: dict, max_words: int = MAX_WORDS) -> dict:
+    """
+    The words that WordCloud.generate_from_frequencies() uses, selected the same way.
+    """
+    return dict(sorted(text_with_frequencies.items(), key=itemgetter(1), reverse=True)[:max_words])
+
+
+def _word_cloud(text_with_frequencies: dict, text_annotations: dict, color_func: Callable = None) -> WordCloud:
+    wordcloud = WordCloud(
+        max_words = MAX_WORDS,
+        width = CLOUD_SIZE,
+        height = CLOUD_SIZE,
+        background_color = 'white',
+        include_numbers = True,
+        repeat = False,
+        mask = circle_mask(),
+        prefer_horizontal=1.0).generate_from_frequencies(text_with_frequencies)
+
+    if color_func == None:
+        color_func = GroupedColorFunc(text_annotations)
+    wordcloud.recolor(color_func = color_func)
+    return wordcloud
+
+
+def _render(args: Tuple[dict, dict, str, Optional[Callable]]) -> str:
+    text_with_frequencies, text_annotations, output_path, color_func = args
+    _word_cloud(text_with_frequencies, text_annotations, color_func).to_file(output_path)
+    return output_path
+
+
 class WordCloudGenerator:
 
     def __init__(
             self,
             text_annotations: dict = {}, 
-            text_with_frequencies: dict = {}):
+            text_with_frequencies: dict = {},
+            index_dir: str = None,
+            normalizer: EntityNormalizer = None):
+        """
+        Parameters
+        ----------
+        index_dir : str
+            If given, the entity index of the source path is saved
+            to and loaded from this directory, so that the TSV files
+            are only parsed again if they changed.
+
+        normalizer : EntityNormalizer
+            If given, spelling and OCR variants of an entity are
+            counted together and shown as the most frequent one.
+        """
         self.text_annotations = text_annotations
         self.text_with_frequencies = text_with_frequencies
+        self.index_dir = index_dir
+        self.normalizer = normalizer
+        self.entity_index: EntityIndex = None
 
     def extract_total_data(self, source_path: str) -> dict:
         """
-        Iterates through all WebAnno TSV files and retrieves all
-        entities and their frequency within all files
+        Retrieves all entities and their frequency within all
+        WebAnno TSV files from the entity index of the files.
 
         Parameters
         ----------
         source_path : str
             The source path of the TSV files
         """
-        self.text_annotations = {}
-        self.text_with_frequencies = {}
-
-        for f in self._retrieve_files(source_path):
-            prev_label_id: int = NO_LABEL_ID
-            prev_text: str = ''
-            prev_token: Token = None
-            for sentence in webanno_tsv_read_file(f).sentences:
-                for token in sentence.tokens:
-                    if token.annotations:
-                        if token.annotations[0].label_id == prev_label_id and token.annotations[0].label_id != NO_LABEL_ID:
-                            prev_text += ' '
-                            prev_text += token.text
-                        else:
-                            if prev_token != None:
-                                frequency = self.text_with_frequencies.get(prev_text.lower(), 0)
-                                self.text_with_frequencies[prev_text.lower()] = frequency + 1
-                                self.text_annotations[prev_text.lower()] = FINE_COARSE_NER_MAPPING[prev_token.annotations[0].label]
-                            prev_token = token
-                            prev_text = token.text
-                        prev_label_id = token.annotations[0].label_id
+        index = self._entity_index(source_path)
+        self._set_frequencies(*index.frequencies())
 
     def extract_coocurrences(
             self, 
@@ -63,12 +127,16 @@ class WordCloudGenerator:
             operator: Operator = Operator.OR,
             relation_entity_types: List[str] = None) -> dict:
         """
-        Iterates through all WebAnno TSV files and counts
-        frequencies within a file for tokens (either entities
-        or non entity tokens). The tokens for the calculations
-        can be concatenated logically, i.e. AND or OR operator
-        and also specified with what entity type it should be
-        calculated, e.g. as PERauthor or as PERaddressee.
+        Counts frequencies of entities within the files that
+        contain the given tokens (either entities or non entity
+        tokens). The files are looked up in the posting lists
+        of the entity index and only their entities are counted.
+        With AND, a file must contain every one of the tokens,
+        with OR, at least one of them. The tokens
+        for the calculations can be concatenated logically, i.e.
+        AND or OR operator and also specified with what entity
+        type it should be calculated, e.g. as PERauthor or as
+        PERaddressee.
 
         Further, the co-ocurrences can also be constrained to
         given entity types.
@@ -97,41 +165,49 @@ class WordCloudGenerator:
             be calculated.
 
         """
-        self.text_annotations = {}
-        self.text_with_frequencies = {}
-        for f in self._retrieve_files(source_path):
-            prev_label_id: int = NO_LABEL_ID
-            prev_text: str = ''
-            prev_token: Token = None
-            temp_text_with_frequencies: dict = {}
-            temp_text_annotations: dict = {}
-            matched: int = 0
-            for sentence in webanno_tsv_read_file(f).sentences:
-                for token in sentence.tokens:
-                    if not entity_only and token.text.lower() in word_entities:
-                        matched += 1
-                    if token.annotations:
-                        if token.annotations[0].label_id == prev_label_id and token.annotations[0].label_id != NO_LABEL_ID:
-                            prev_text += ' '
-                            prev_text += token.text
-                        else:
-                            if prev_token != None:
-                                if self._token_in_word_entities(prev_token, word_entities):
-                                    matched += 1
-                                elif (relation_entity_types == None or (prev_token.annotations[0].label in relation_entity_types 
-                                        or FINE_COARSE_NER_MAPPING[prev_token.annotations[0].label] in relation_entity_types)):
-                                    frequency = temp_text_with_frequencies.get(prev_text.lower(), 0)
-                                    temp_text_with_frequencies[prev_text.lower()] = frequency + 1
-                                    temp_text_annotations[prev_text.lower()] = FINE_COARSE_NER_MAPPING[prev_token.annotations[0].label]
-                            prev_token = token
-                            prev_text = token.text
-                        prev_label_id = token.annotations[0].label_id
-            if operator == Operator.OR and matched > 0 or Operator.AND and matched >= len(word_entities):
-                for text, freq in temp_text_with_frequencies.items():
-                    stored_freq = self.text_with_frequencies.get(text, 0)
-                    self.text_with_frequencies[text] = stored_freq + freq
-                for text, annotation in temp_text_annotations.items():
-                    self.text_annotations[text] = annotation
+        index = self._entity_index(source_path)
+        if word_entities:
+            files = index.query(word_entities, conjunctive=operator == Operator.AND, entity_only=entity_only)
+        else:
+            files = np.arange(len(index.files))
+        rows = index.file_rows(files)
+        text_ids = np.asarray(index.text_ids)[rows]
+        head_ids = np.asarray(index.head_ids)[rows]
+        label_ids = np.asarray(index.label_ids)[rows]
+
+        # the entities matching the words are not counted as their co-occurrences
+        keep = np.ones(len(rows), dtype=bool)
+        for word, entity in word_entities.items():
+            text_id = index.texts.ids.get(normalize_text(word))
+            if text_id is None:
+                continue
+            anchors = (head_ids == text_id) | (text_ids == text_id)
+            if entity:
+                anchors &= index.label_mask([entity])[label_ids]
+            keep &= ~anchors
+        if relation_entity_types is not None:
+            keep &= index.label_mask(relation_entity_types)[label_ids]
+        self._set_frequencies(*index.frequencies(rows[keep]))
+
+    def _set_frequencies(self, text_with_frequencies: dict, text_annotations: dict):
+        if self.normalizer:
+            text_with_frequencies, text_annotations = self.normalizer.merge(text_with_frequencies, text_annotations)
+            self.normalizer.save()
+        self.text_with_frequencies, self.text_annotations = text_with_frequencies, text_annotations
+
+    def _entity_index(self, source_path: str) -> EntityIndex:
+        files = self._retrieve_files(source_path)
+        if self.entity_index and self.entity_index.is_current(files):
+            return self.entity_index
+        if self.index_dir and EntityIndex.exists(self.index_dir):
+            index = EntityIndex.load(self.index_dir)
+            if index.is_current(files):
+                self.entity_index = index
+                return index
+        self.entity_index = EntityIndex.build(source_path, files)
+        if self.index_dir:
+            self.entity_index.save(self.index_dir)
+        return self.entity_index
 
     def _retrieve_files(self, source_path: str) -> List[str]:
         data: List[str] = []
@@ -140,23 +216,12 @@ class WordCloudGenerator:
                 data.append(os.path.join(root, file))
         return data
 
-    def _token_in_word_entities(
-            self, 
-            token: Token, 
-            word_entities: dict):
-        for word, entity in word_entities.items():
-            if token.text.lower() == word.lower() and (
-                    not entity or entity == '' 
-                    or token.annotations[0].label == entity
-                    or FINE_COARSE_NER_MAPPING[token.annotations[0].label] == entity):
-                return True
-        return False
-
     def generate(self, 
             output_path: str = None,
             color_func: Callable = None,
             exclude_entities: List[str] = [],
-            exclude_entity_types: List[str] = []):
+            exclude_entity_types: List[str] = [],
+            show: bool = True):
         """
         Generates a word cloud and uses interal data, i.e.
         frequency calculation must be done before calling
@@ -179,52 +244,85 @@ class WordCloudGenerator:
         exclude_entity_types:
             If give, entity types to be ignored for the 
             word cloud generation. 
+
+        show:
+            If False, the word cloud is not shown with
+            matplotlib, only stored to output_path.
         """
         text_with_frequencies = self._filter(exclude_entities, exclude_entity_types)
-        self._generate_word_cloud(text_with_frequencies, output_path, color_func)
+        wordcloud = _word_cloud(text_with_frequencies, self.text_annotations, color_func)
+        if show:
+            self._show(wordcloud)
+        if output_path != None:
+            wordcloud.to_file(output_path)
+
+    def generate_batch(self,
+            source_path: str,
+            jobs: List[WordCloudJob],
+            processes: int = 1,
+            color_func: Callable = None) -> List[str]:
+        """
+        Generates the word clouds of all jobs headless, i.e.
+        straight to their output paths without matplotlib.
+        The frequencies are calculated one job after the
+        other from the entity index, the word clouds are
+        then laid out and stored in parallel. Afterwards,
+        the interal data is the one of the last job.
+
+        Parameters
+        ----------
+        source_path : str
+            Source path of the TSV files
+
+        jobs:
+            The word clouds to generate.
+
+        processes:
+            If bigger than 1, the word clouds are generated
+            in a pool of this many worker processes.
+
+        color_func:
+            If given, uses own color function for all word
+            clouds, it has to be picklable for processes > 1.
+            Otherwise GroupedColorFunc will be used.
+
+        Returns the output paths in the order of the jobs.
+        """
+        renders = []
+        for job in jobs:
+            if job.word_entities is None:
+                self.extract_total_data(source_path)
+            else:
+                self.extract_coocurrences(source_path, job.word_entities, job.entity_only,
+                                          job.operator, job.relation_entity_types)
+            # only the words that are drawn are sent to the workers
+            text_with_frequencies = top_words(self._filter(job.exclude_entities, job.exclude_entity_types))
+            text_annotations = {text: self.text_annotations[text] for text in text_with_frequencies}
+            output_dir = os.path.dirname(job.output_path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            renders.append((text_with_frequencies, text_annotations, job.output_path, color_func))
+
+        with Pool(processes) if processes > 1 else nullcontext() as pool:
+            rendered = pool.imap(_render, renders) if pool else map(_render, renders)
+            return list(rendered)
 
     def _filter(self,
             exclude_entities: List[str] = None,
             exclude_entity_types: List[str] = []) -> dict:
         return {text: frequency 
                 for text, frequency in self.text_with_frequencies.items() 
-                if text not in exclude_entities and FINE_COARSE_NER_MAPPING[self.text_annotations[text]] not in exclude_entity_types}
+                if text not in exclude_entities and LABELS.coarse(self.text_annotations[text]) not in exclude_entity_types}
+
+    def _show(self, wordcloud: WordCloud):
+        # imported here, so that headless generation does not need matplotlib
+        import matplotlib.pyplot as plt
 
-    def _generate_word_cloud(
-            self,
-            text_with_frequencies: dict,
-            output_path: str = None,
-            color_func: Callable = None):
-        mask = self._circle_mask()
-        
-        wordcloud = WordCloud(
-            max_words = 100,
-            width = 1000,
-            height = 1000,
-            background_color = 'white',
-            include_numbers = True,
-            repeat = False,
-            mask = mask,
-            prefer_horizontal=1.0).generate_from_frequencies(text_with_frequencies)
-
-        if color_func == None:
-            color_func = GroupedColorFunc(self.text_annotations)
-        wordcloud.recolor(color_func = color_func)
-        
         plt.figure()
         plt.imshow(wordcloud, interpolation='bilinear')
         plt.axis('off')
         plt.show()
 
-        if output_path != None:
-            wordcloud.to_file(output_path)
-
-    def _circle_mask(self): 
-        x, y = np.ogrid[:1000, :1000]
-
-        mask = (x - 500) ** 2 + (y - 500) ** 2 > 500 ** 2
-        return 255 * mask.astype(int)
-
 class GroupedColorFunc(object):
     """Create a color function object which assigns colors of
        specified colors to words based on the annotation.
@@ -240,21 +338,12 @@ class GroupedColorFunc(object):
     """
 
     def __init__(self, text_annotations, default_color='grey'):
-        color_def = self.random_color_definition()
-        self.word_to_color = {word: color_def.get(annotation)
+        self.word_to_color = {word: LABELS.color(annotation)
                               for (word, annotation) in text_annotations.items()}
         self.default_color = default_color
 
     def random_color_definition(self) -> dict:
-        return {
-                'PER': '#ed8311',
-                'DATE': '#ba0404',
-                'PLACE': '#40ab02',
-                'OBJ': '#0283ba',
-                'ORG': '#4c02ba',
-                'MISC': '#02a8ba',
-                'LIT': '#f0e800'
-            }
+        return dict(COARSE_TO_COLOR)
 
     def __call__(self, word, **kwargs):
         return self.word_to_color.get(word, self.default_color)
@@ -2,29 +2,30 @@
 
 import argparse
 import difflib
+import json
 import logging
 import os
 import re
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import Iterator, List, Sequence, Tuple, TypeVar
-
-from nltk.data import load as nltk_load
-from nltk.tokenize import word_tokenize
+from typing import (Callable, Collection, Dict, Iterator, List, Optional,
+                    Sequence, Tuple, TypeVar)
 
 from data_access import util
-from data_access.webanno_tsv import (Annotation, Document, Token,
-                                     webanno_tsv_read_file)
+from data_access.ocr_pages import PAGE_SEP, count_pages, read_pages
+from data_access.token_matching import FuzzyScorer, TokenMatcher
+from data_access.tokenization import (iter_tokenize_pages, split_sentences,
+                                      tokenize_page, tokenize_words)
+from data_access.webanno_tsv import (Annotation, Document, SpanIndex, Token,
+                                     parse_page_number, webanno_tsv_read_file,
+                                     webanno_tsv_read_text)
 
 T = TypeVar('T')
 
 logger = logging.getLogger(__file__)
 
-PAGE_SEP = "\f"
-
-RESOURCE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data_access', 'resources')
-SENTENCE_TOKENIZER_PICKLE = os.path.join(RESOURCE_DIR, 'dai_german_punkt.pickle')
-sentence_tokenizer = nltk_load(SENTENCE_TOKENIZER_PICKLE)
-
 TARGET_LAYER = 'webanno.custom.LetterEntity'
 TARGET_FIELD = 'value'
 OUTPUT_LAYERS = [(TARGET_LAYER, ['entity_id', TARGET_FIELD])]
@@ -71,6 +72,9 @@ FILE_NAMES = [
 
 EMPTY_DOC = Document()
 
+# The number of characters at the beginning of pages compared to correct the page order
+FIT_TEXT_LEN = 600
+
 
 def webanno_page_paths(export_dir: Path, page_glob: str, annotator: str) -> List[Path]:
     path_glob_in_dir = os.path.join(page_glob, annotator + '.tsv')
@@ -78,16 +82,32 @@ def webanno_page_paths(export_dir: Path, page_glob: str, annotator: str) -> List
     return sorted(paths)
 
 
-def ocr_page_split(ocr_text: str) -> [str]:
-    return ocr_text.split(PAGE_SEP)
-
-
-def webanno_file_for_idx(paths: List[Path], index: int):
-    # webanno files have the 0-padded page number in the file name
-    idx_str = "_page%03d" % index
-    paths = [p for p in paths if idx_str in str(p)]
-    assert (len(paths) <= 1)
-    return paths[0] if len(paths) == 1 else None
+def webanno_page_index(paths: List[Path]) -> Dict[int, Path]:
+    """
+    Map page numbers to the webanno file of that page, parsing each path only once.
+    """
+    index = {}
+    for path in paths:
+        # webanno files are in a directory named like the original file, which has the page number
+        page_no = parse_page_number(path.parent.name, strict=True)
+        if page_no in index:
+            raise ValueError('Duplicate webanno files for page %d: %s, %s' % (page_no, index[page_no], path))
+        index[page_no] = path
+    return index
+
+
+def align_webanno_docs(webanno_docs: List[T], page_numbers: Collection[int], page_count: int,
+                       placeholder=EMPTY_DOC) -> List[T]:
+    """
+    Return a list with one document for each of page_count pages. The webanno_docs are
+    taken in order for the given page numbers, other pages (e.g. pages that were never
+    annotated) get the placeholder.
+    """
+    assert (len(webanno_docs) == len(page_numbers))
+    docs = iter(webanno_docs)
+    aligned = [next(docs) if page_no in page_numbers else placeholder for page_no in range(1, page_count + 1)]
+    assert (next(docs, None) is None)
+    return aligned
 
 
 def clean_ocr(text: str) -> str:
@@ -97,19 +117,29 @@ def clean_ocr(text: str) -> str:
 
 
 def webanno_create_document(text: str) -> Document:
+    return webanno_document_from_sentences(tokenize_page(text))
+
+
+def webanno_document_from_sentences(sentences: List[List[str]]) -> Document:
     doc = Document(OUTPUT_LAYERS)
-    sentences = sentence_tokenizer.tokenize(text, realign_boundaries=True)
-    for sentence in sentences:
-        words = word_tokenize(sentence, 'german')
+    for words in sentences:
         doc.add_tokens_as_sentence(words)
     return doc
 
 
-def exact_match(needle: List[Token], haystack: List[Token]) -> Sequence[Token]:
-    idx = util.find_subsequence([t.text for t in haystack], [t.text for t in needle])
-    if idx >= 0:
-        return haystack[idx:idx + len(needle)]
-    return []
+def webanno_document_text_prefix(text: str, length: int) -> str:
+    """
+    Return the first length characters of webanno_create_document(text).text, only
+    tokenizing as many sentences as needed for that.
+    """
+    sentence_texts = []
+    text_len = 0
+    for sentence in split_sentences(text):
+        sentence_texts.append(' '.join(tokenize_words(sentence)))
+        text_len += len(sentence_texts[-1]) + 1
+        if text_len > length:
+            break
+    return '\n'.join(sentence_texts)[:length]
 
 
 def inexact_match(needle: List[Token], haystack: List[Token], cutoff=0.75) -> Sequence[Token]:
@@ -136,15 +166,15 @@ def match_between(before: List[Token], after: List[Token], candidates: List[Toke
     return []
 
 
-def match_before_or_after(query: List[Token], doc: Document, exclude: List[Token]) -> Sequence[Token]:
-    doc_tokens = doc.tokens
+def match_before_or_after(query: List[Token], index: SpanIndex, exclude: List[Token]) -> Sequence[Token]:
+    doc_tokens = index.tokens
+    start = index.position(exclude[0])
+    end = index.position(exclude[-1])
     for n in [5, 10, 15, 20, 40]:
-        start = doc_tokens.index(exclude[0])
         before = doc_tokens[max(0, start - n):start]
         result = inexact_match(query, before, 0.8)
         if result:
             break
-        end = doc_tokens.index(exclude[-1])
         after = doc_tokens[end + 1:min(end + n, len(doc_tokens))]
         result = inexact_match(query, after, 0.8)
         if result:
@@ -152,8 +182,8 @@ def match_before_or_after(query: List[Token], doc: Document, exclude: List[Token
     return result
 
 
-def match_similiar_before_or_after(tokens: List[Token], doc: Document) -> Sequence[Token]:
-    return match_before_or_after(tokens, doc, tokens)
+def match_similiar_before_or_after(tokens: List[Token], index: SpanIndex) -> Sequence[Token]:
+    return match_before_or_after(tokens, index, tokens)
 
 
 def sort_webanno_docs_for_id_882135(webanno_docs):
@@ -182,19 +212,23 @@ def reduce_to_uppercase_begin(text: str):
         return text
 
 
-def handle_multiple_annotations_of_same_type(doc: Document, annotation: Annotation, tokens: List[Token]) -> bool:
+def handle_multiple_annotations_of_same_type(doc: Document, annotation: Annotation, tokens: List[Token],
+                                             index: SpanIndex = None) -> bool:
     """
     This handles the (not uncommon) case that we might wish to assign an annotation
     to set of tokens that already have an annotation of the same type. This especially
     occurs of an item is mentioned twice in close proximity. We then look around the target
     tokens for a similar string and prefer assigning to that string.
 
+    :param index: The doc's SpanIndex for the target layer and field, kept up to date by this method.
+        Built from the doc if not given.
     :return: Whether the annotation was handled by this method or not.
     """
+    if index is None:
+        index = SpanIndex(doc, TARGET_LAYER, TARGET_FIELD)
     # Example: if annotation has label 'PERauthor' check if 'PER' is present on target tokens
     label = reduce_to_uppercase_begin(annotation.label)
-    others = {a for t in tokens for a in t.annotations if a.layer_name == TARGET_LAYER and a.field_name == TARGET_FIELD}
-    others = {o for o in others if reduce_to_uppercase_begin(o.label) == label}
+    others = {o for o in index.annotations_on(tokens) if reduce_to_uppercase_begin(o.label) == label}
 
     if len(others) == 0:
         return False
@@ -202,57 +236,75 @@ def handle_multiple_annotations_of_same_type(doc: Document, annotation: Annotati
         logger.debug("Not handling case with 2+ annotations already present.")
         return False
 
-    other_tokens = match_similiar_before_or_after(tokens, doc)
+    other_tokens = match_similiar_before_or_after(tokens, index)
     if other_tokens:
         other = others.pop()
         doc.remove_annotation(other)
-        for annotation, targets in sort_targets([annotation, other], [tokens, other_tokens]):
-            copy_annotation(annotation, targets)
+        index.remove(other)
+        for annotation, targets in sort_targets([annotation, other], [tokens, other_tokens], index):
+            copy_annotation(annotation, targets, index)
         return True
     return False
 
 
-def sort_targets(sources: List[Annotation], targets: List[List[Token]]) -> Iterator[Tuple[Annotation, List[Token]]]:
+def sort_targets(sources: List[Annotation], targets: List[List[Token]],
+                 index: SpanIndex) -> Iterator[Tuple[Annotation, List[Token]]]:
     # we assume that annotations should be copied in order of their label id
-    doc_tokens = targets[0][0].doc.tokens
-    targets = sorted(targets, key=lambda ts: doc_tokens.index(ts[0]))
+    targets = sorted(targets, key=lambda ts: index.position(ts[0]))
     sources = sorted(sources, key=lambda a: a.label_id)
     return zip(sources, targets)
 
 
-def copy_annotation(source: Annotation, targets: List[Token]):
+def copy_annotation(source: Annotation, targets: List[Token], index: SpanIndex = None):
     if targets:
         annotation = Annotation(tokens=targets, layer_name=source.layer_name, field_name=source.field_name,
                                 label=source.label, label_id=source.label_id)
-        targets[0].doc.add_annotation(annotation)
+        added = targets[0].doc.add_annotation(annotation)
+        if index is not None:
+            index.add(added)
     else:
         raise ValueError('Empty list of target tokens.')
 
 
-def reorder_documents_for_fit(docs1: List[Document], docs2: List[Document], min_ratio=0.2, text_len=600):
+def reorder_documents_for_fit(docs1: List[Document], docs2: List[Document], min_ratio=0.2, text_len=FIT_TEXT_LEN):
     """
     Attempt to correct wrong page order by matching beginnings of documents.
     Returns two new lists with the second one reordered for better matching the first.
     NOTE: This does not reorder a whole lot of documents, but prevents a lot of errors in those.
     """
     assert (len(docs1) == len(docs2))
+    order = fit_order([None if d == EMPTY_DOC else d.text[:text_len] for d in docs1],
+                      [None if d == EMPTY_DOC else d.text[:text_len] for d in docs2],
+                      min_ratio)
+    return list(docs1), [docs2[idx] for idx in order]
+
+
+def fit_order(texts1: List[Optional[str]], texts2: List[Optional[str]], min_ratio=0.2) -> List[int]:
+    """
+    The ordering of reorder_documents_for_fit() computed from the beginnings of the
+    documents' texts only, with None given for an EMPTY_DOC.
+    Returns for each position the index of the item in texts2 that should be placed there.
+    """
+    assert (len(texts1) == len(texts2))
     candidates = []
-    for idx, (d1, d2) in enumerate(zip(docs1, docs2)):
-        ratio = difflib.SequenceMatcher(None, d1.text[:text_len], d2.text[:text_len]).ratio()
-        if ratio < min_ratio and docs1[idx] != EMPTY_DOC and docs2[idx] != EMPTY_DOC:
+    for idx, (t1, t2) in enumerate(zip(texts1, texts2)):
+        if t1 is None or t2 is None:
+            continue
+        ratio = difflib.SequenceMatcher(None, t1, t2).ratio()
+        if ratio < min_ratio:
             candidates.append(idx)
 
-    copy_docs2 = list(docs2)
+    order = list(range(len(texts2)))
     while candidates:
         idx1 = candidates.pop()
-        texts = [docs2[idx2].text[:text_len] for idx2 in candidates]
-        match: List[str] = difflib.get_close_matches(docs1[idx1].text[:text_len], texts, 1, min_ratio)
+        texts = [texts2[idx2] for idx2 in candidates]
+        match: List[str] = difflib.get_close_matches(texts1[idx1], texts, 1, min_ratio)
         if match:
             idx_match = candidates[texts.index(match[0])]
             candidates.remove(idx_match)
-            copy_docs2[idx1] = docs2[idx_match]
+            order[idx1] = idx_match
 
-    return list(docs1), copy_docs2
+    return order
 
 
 def print_no_match_information(annotation: Annotation):
@@ -281,7 +333,94 @@ def print_no_match_information(annotation: Annotation):
     print_tokens(line)
 
 
-def copy_annotations(doc_with_annotations: Document, other: Document, print_no_match=False) -> (int, int, int):
+@dataclass
+class MatchRecord:
+    """
+    How one annotation was matched: The stage that produced the match ('exact', 'inexact',
+    'around' or 'none'), the window size and cutoff of that stage, the similarity score
+    of the match and the seconds spent on each step that was tried.
+    """
+    book: str
+    page: int
+    text: str
+    label: str
+    stage: str = 'none'
+    window: Optional[int] = None
+    cutoff: Optional[float] = None
+    score: Optional[float] = None
+    timings: List[Tuple[str, float]] = field(default_factory=list)
+
+
+def match_step_name(stage: str, window: Optional[int] = None, cutoff: Optional[float] = None) -> str:
+    name = stage
+    if window is not None:
+        name += ' w%d' % window
+    if cutoff is not None:
+        name += ' c%.2f' % cutoff
+    return name
+
+
+class MatchLog:
+    """
+    Collects MatchRecords from copy_annotations() for the page set with start_page().
+    """
+
+    def __init__(self):
+        self.records: List[MatchRecord] = []
+        self._book = ''
+        self._page = 0
+
+    def start_page(self, book: str, page: int):
+        self._book = book
+        self._page = page
+
+    def new_record(self, annotation: Annotation) -> MatchRecord:
+        record = MatchRecord(book=self._book, page=self._page, text=annotation.text, label=annotation.label)
+        self.records.append(record)
+        return record
+
+    def clear(self):
+        self.records.clear()
+
+    def write_jsonl(self, path: str):
+        with open(path, mode='a', encoding='utf-8') as f:
+            for record in self.records:
+                f.write(json.dumps(asdict(record), ensure_ascii=False))
+                f.write('\n')
+
+    def profile(self) -> str:
+        """
+        Return a table with the number of tries, matches and the time spent for each
+        step of the matching, in the order that steps were first tried.
+        """
+        tries: Dict[str, int] = defaultdict(int)
+        matches: Dict[str, int] = defaultdict(int)
+        seconds: Dict[str, float] = defaultdict(float)
+        for record in self.records:
+            for step, duration in record.timings:
+                tries[step] += 1
+                seconds[step] += duration
+            if record.stage != 'none':
+                matches[match_step_name(record.stage, record.window, record.cutoff)] += 1
+        lines = ['% 6s\t% 6s\t% 9s\t% 9s\t%s' % ('tries', 'hits', 'ms', 'ms/hit', 'step')]
+        for step in tries:
+            ms = 1000 * seconds[step]
+            per_hit = '%.2f' % (ms / matches[step]) if matches[step] else '-'
+            lines.append('% 6d\t% 6d\t% 9.1f\t% 9s\t%s' % (tries[step], matches[step], ms, per_hit, step))
+        return '\n'.join(lines)
+
+
+def _copy_matched(other: Document, annotation: Annotation, tokens: List[Token], index: SpanIndex) -> None:
+    if not handle_multiple_annotations_of_same_type(other, annotation, tokens, index):
+        copy_annotation(annotation, tokens, index)
+
+
+def _untimed(stage: str, half_window: Optional[int], cutoff: Optional[float], fn: Callable[..., T], *args) -> T:
+    return fn(*args)
+
+
+def copy_annotations(doc_with_annotations: Document, other: Document, print_no_match=False,
+                     match_log: MatchLog = None) -> (int, int, int):
     high_confidence = 0
     lower_confidence = 0
     not_found = 0
@@ -289,6 +428,8 @@ def copy_annotations(doc_with_annotations: Document, other: Document, print_no_m
     tokens_with = doc_with_annotations.tokens
     tokens_without = other.tokens
     diff = len(tokens_without) - len(tokens_with)
+    matcher = TokenMatcher([t.text for t in tokens_without])
+    index = SpanIndex(other, TARGET_LAYER, TARGET_FIELD)
 
     for annotation in doc_with_annotations.annotations_with_type(TARGET_LAYER, TARGET_FIELD):
 
@@ -297,52 +438,76 @@ def copy_annotations(doc_with_annotations: Document, other: Document, print_no_m
         lookup_start = anno_start + int(diff / 2)  # correct for the difference in token length
         lookup_stop = lookup_start + len(annotation.tokens)
 
+        def window(half_window: int) -> Tuple[int, int]:
+            return max(0, lookup_start - half_window), min(len(tokens_without), lookup_stop + half_window)
+
         def slice_candidates(half_window: int):
-            s = max(0, lookup_start - half_window)
-            e = min(len(tokens_without), lookup_stop + half_window)
-            return tokens_without[s:e]
+            start, stop = window(half_window)
+            return tokens_without[start:stop]
 
-        tokens = []
+        record = match_log.new_record(annotation) if match_log else None
+        if record is None:
+            # without a match log, nothing is timed or recorded
+            timed = _untimed
+        else:
+            def timed(stage: str, half_window: Optional[int], cutoff: Optional[float], fn: Callable[..., T], *args) -> T:
+                start = time.perf_counter()
+                result = fn(*args)
+                record.timings.append((match_step_name(stage, half_window, cutoff), time.perf_counter() - start))
+                if result:
+                    record.stage, record.window, record.cutoff = stage, half_window, cutoff
+                return result
+
+        needle = annotation.token_texts
+        scorer = FuzzyScorer(needle)
+        match = None
 
         # these are matches with a high probability of being correct (high cutoff and near the intended area)
         window_sizes = [(0, 3), (8, 20)]
         for exact_size, inexact_size in window_sizes:
-            tokens = exact_match(annotation.tokens, slice_candidates(exact_size))
-            if tokens:
+            match = timed('exact', exact_size, None, matcher.exact_match, needle, *window(exact_size))
+            if match:
                 high_confidence += 1
                 break
             else:
-                tokens = inexact_match(annotation.tokens, slice_candidates(inexact_size), 0.8)
-                if tokens:
+                match = timed('inexact', inexact_size, 0.8, matcher.inexact_match, scorer, *window(inexact_size), 0.8)
+                if match:
                     high_confidence += 1
                     break
 
         # these are matches with a lower degree of probability (lower cutoff, somewhat more far from intended area)
         sizes_cutoffs = [(3, 0.72), (3, 0.65), (8, 0.72), (8, 0.65), (20, 0.72), (20, 0.65), (40, 0.75)]
-        if not tokens:
+        if not match:
             for size, cutoff in sizes_cutoffs:
-                tokens = inexact_match(annotation.tokens, slice_candidates(size), cutoff)
-                if tokens:
-                    logger.debug('LOW: %s -> %s' % (annotation.text, ' '.join(t.text for t in tokens)))
+                match = timed('inexact', size, cutoff, matcher.inexact_match, scorer, *window(size), cutoff)
+                if match:
+                    logger.debug('LOW: %s -> %s' % (annotation.text, ' '.join(t.text for t in tokens_without[match.start:match.stop])))
                     lower_confidence += 1
                     break
 
+        tokens = tokens_without[match.start:match.stop] if match else []
+        if record is not None:
+            record.score = match.score if match else None
+
         # if we have still no matches, try matching text around the annotation
         if not tokens:
             w = 6
             candidates = slice_candidates(40)
             before = tokens_with[max(0, anno_start - w):anno_start]
             after = tokens_with[anno_stop:min(len(tokens_with), anno_stop + w)]
-            between = match_between(before, after, candidates)
-            if 0 < len(between) < (2 * len(annotation.tokens)):
-                tokens = between
+
+            def match_around() -> List[Token]:
+                between = match_between(before, after, candidates)
+                return between if 0 < len(between) < (2 * len(annotation.tokens)) else []
+
+            tokens = timed('around', 40, None, match_around)
+            if tokens:
                 logger.debug('AROUND: %s -> %s' % (annotation.text, ' '.join(t.text for t in tokens)))
                 lower_confidence += 1
 
         if tokens:
             annotation.label = normalize_annotation_label(annotation)
-            if not handle_multiple_annotations_of_same_type(other, annotation, tokens):
-                copy_annotation(annotation, tokens)
+            timed('copy', None, None, _copy_matched, other, annotation, tokens, index)
         else:
             logger.debug('NO MATCH: %s \n--> %s' % (annotation.text, ' '.join(c.text for c in slice_candidates(20))))
             if print_no_match:
@@ -363,42 +528,64 @@ def main(args):
     if args.debug:
         logging.basicConfig(level=logging.DEBUG, format='%(message)s')
 
+    match_log = None
+    if args.match_log or args.profile:
+        match_log = MatchLog()
+    if args.match_log and os.path.exists(args.match_log):
+        os.remove(args.match_log)
+
     # Keep counts of types of matches
     per_document_counts: List[(str, int, int, int)] = []
     for ocr_filename, webanno_glob in FILE_NAMES:
+        book = os.path.splitext(ocr_filename)[0]
 
-        with open(args.ocr_dir / ocr_filename, mode='r', encoding='utf-8') as f:
-            ocr_texts = ocr_page_split(f.read())
+        ocr_path = args.ocr_dir / ocr_filename
+        page_count = count_pages(ocr_path)
 
         page_paths = webanno_page_paths(args.webanno_dir, webanno_glob, args.annotator)
-        webanno_docs = [webanno_tsv_read_file(str(f)) for f in page_paths]
+        page_index = webanno_page_index(page_paths)
+        webanno_paths = [page_index[page_no] for page_no in sorted(page_index)]
 
         if ocr_filename == '000882135.txt':
-            webanno_docs = sort_webanno_docs_for_id_882135(webanno_docs)
+            webanno_paths = sort_webanno_docs_for_id_882135(webanno_paths)
 
         # Some ocr pages do not have counterparts in the webanno docs
         # (happens for example if the pages were never annotated)
-        for idx in range(len(ocr_texts)):
-            if webanno_file_for_idx(page_paths, idx + 1) is None:
-                webanno_docs.insert(idx, EMPTY_DOC)
-        assert (len(ocr_texts) == len(webanno_docs))
+        webanno_paths = align_webanno_docs(webanno_paths, page_index.keys(), page_count, placeholder=None)
 
-        ocr_texts = [clean_ocr(t) for t in ocr_texts]
-        ocr_docs = [webanno_create_document(t) for t in ocr_texts]
-        ocr_docs, webanno_docs = reorder_documents_for_fit(ocr_docs, webanno_docs)
+        # Reordering only needs the beginnings of the documents' texts, so we do not keep
+        # whole books in memory, but read pages and webanno documents again for matching.
+        ocr_prefixes = [webanno_document_text_prefix(clean_ocr(text), FIT_TEXT_LEN) for _, text in read_pages(ocr_path)]
+        webanno_prefixes = [webanno_tsv_read_text(str(p))[:FIT_TEXT_LEN] if p else None for p in webanno_paths]
+        order = fit_order(ocr_prefixes, webanno_prefixes)
 
         counts = (0, 0, 0)
-        for idx, (ocr_doc, webanno_doc) in enumerate(zip(ocr_docs, webanno_docs)):
-            result = copy_annotations(webanno_doc, ocr_doc, args.print_no_match)
+        ocr_texts = (clean_ocr(text) for _, text in read_pages(ocr_path))
+        for idx, sentences in enumerate(iter_tokenize_pages(ocr_texts, args.jobs)):
+            ocr_doc = webanno_document_from_sentences(sentences)
+            webanno_path = webanno_paths[order[idx]]
+            webanno_doc = webanno_tsv_read_file(str(webanno_path)) if webanno_path else EMPTY_DOC
+
+            if match_log:
+                match_log.start_page(book, idx + 1)
+            result = copy_annotations(webanno_doc, ocr_doc, args.print_no_match, match_log)
             counts = (i + j for i, j in zip(counts, result))
 
             if args.output_dir:
-                filename = '%s_page%03d.tsv' % (os.path.splitext(ocr_filename)[0], idx + 1)
+                filename = '%s_page%03d.tsv' % (book, idx + 1)
                 with open(os.path.join(args.output_dir, filename), mode='w', encoding='utf-8') as f:
                     f.write(ocr_doc.tsv())
 
         per_document_counts.append((webanno_glob, *counts))
 
+        if match_log:
+            if args.match_log:
+                match_log.write_jsonl(args.match_log)
+            if args.profile:
+                print('PROFILE: %s' % book)
+                print(match_log.profile())
+            match_log.clear()
+
     totals = (
         f'SUMS ({sum(a + b + c for _, a, b, c in per_document_counts)})',
         sum(a[1] for a in per_document_counts),
@@ -423,4 +610,10 @@ if __name__ == '__main__':
     parser.add_argument('-p', '--print-no-match', action='store_true',
                         help="Print information on non-matching annotations.")
     parser.add_argument('-d', '--debug', action='store_true', help='Print some debug messages if present.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of worker processes used to tokenize the ocr pages.')
+    parser.add_argument('--match-log', type=Path,
+                        help='If present, write a JSON line for each matched annotation to this file.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print a table of tries, matches and time spent per matching step for each book.')
     main(parser.parse_args())
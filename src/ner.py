@@ -1,5 +1,4 @@
 import os
-import re
 from pathlib import Path
 
 from flair.data import Sentence as Flair_Sentence
@@ -8,19 +7,17 @@ from flair.models import SequenceTagger
 from src.data_access.book_viewer_json import BookViewerJsonBuilder, Kind
 from src.data_access.iob_data_transformer import (IOB_INSIDE, IOB_NULL,
                                                   IOB_OUTSIDE)
+from src.data_access.labels import LabelKindResolver
+from src.data_access.ocr_pages import read_pages
+from src.data_access.tokenization import split_sentences
 from src.data_access.webanno_tsv import NO_LABEL_ID, Annotation, Document
 from src.data_access.webanno_tsv import Sentence as WebAnno_Sentence
 from src.data_access.webanno_tsv import Token, webanno_tsv_write
-from src.match_webanno_ocr import (OUTPUT_LAYERS, PAGE_SEP, TARGET_FIELD,
-                                   TARGET_LAYER, clean_ocr, sentence_tokenizer)
+from src.match_webanno_ocr import (OUTPUT_LAYERS, TARGET_FIELD, TARGET_LAYER,
+                                   clean_ocr)
 from src.write_book_viewer_json import convert_annotation
 
-LABELS_TO_KINDS = [
-    (re.compile('PER'), Kind.person),
-    (re.compile('PLACE'), Kind.location),
-    (re.compile('DATE'), Kind.timex),
-    (re.compile('(OBJ|ORG|LIT|MISC)'), Kind.keyterm)
-]
+KINDS = LabelKindResolver(Kind)
 
 class NER:
 
@@ -34,35 +31,38 @@ class NER:
                     file = os.path.join(root, file),
                     output_webanno_path = output_webanno_path,
                     output_bookviewer_path = output_bookviewer_path)
+        # the book viewer files are written without the annotations of unknown labels,
+        # which are reported for all files together
+        KINDS.check()
     
     def annotate_file(self, file: str, output_webanno_path: str, output_bookviewer_path: str):
-        with open(file, mode='r', encoding='utf-8') as f:
-            pages = f.read().split(PAGE_SEP)
-            builder = BookViewerJsonBuilder()
-            last_annotation = None
-            for page_number, page_text in enumerate(pages):
-                doc = self.annotate_page(
-                    page_text = page_text,
-                    last_annotation = last_annotation)
-                
-                self.write_webanno_file(
-                    output_path = output_webanno_path, 
-                    file = file, 
-                    page_number = page_number, 
-                    doc = doc)
-
-                for annotation in doc.annotations_with_type(TARGET_LAYER, TARGET_FIELD):
-                    convert_annotation(
-                        builder = builder, 
-                        page_no = page_number, 
-                        a = annotation, 
-                        labels_to_kinds = LABELS_TO_KINDS)
-            
-            self.write_bookviewer_file(
-                output_path = output_bookviewer_path,
-                file = file,
-                builder = builder
-            )
+        builder = BookViewerJsonBuilder()
+        last_annotation = None
+        for page_no, page_text in read_pages(file):
+            page_number = page_no - 1
+            doc = self.annotate_page(
+                page_text = page_text,
+                last_annotation = last_annotation)
+
+            self.write_webanno_file(
+                output_path = output_webanno_path, 
+                file = file, 
+                page_number = page_number, 
+                doc = doc)
+
+            for annotation in doc.annotations_with_type(TARGET_LAYER, TARGET_FIELD):
+                convert_annotation(
+                    builder = builder, 
+                    page_no = page_number, 
+                    a = annotation, 
+                    kinds = KINDS,
+                    location = file)
+
+        self.write_bookviewer_file(
+            output_path = output_bookviewer_path,
+            file = file,
+            builder = builder
+        )
                 
 
     def annotate_page(self, page_text: str, last_annotation: Annotation):
@@ -70,7 +70,7 @@ class NER:
         next_label_idx = 1
         last_label_prefix = None
         doc = Document(OUTPUT_LAYERS)
-        sentences = sentence_tokenizer.tokenize(clean_ocr(page_text), realign_boundaries=True)
+        sentences = split_sentences(clean_ocr(page_text))
         for i, sentence_text in enumerate(sentences):
             text = sentence_text.replace('\n', ' ')
             flair_sentence = Flair_Sentence(text)
@@ -2,74 +2,203 @@
 
 import argparse
 import glob
+import json
 import os
 import pathlib
-import re
-from typing import Iterable
+from contextlib import nullcontext
+from functools import reduce
+from itertools import groupby
+from multiprocessing import Pool
+from typing import Dict, Iterable, List, Tuple
 
-from data_access.book_viewer_json import BookViewerJsonBuilder, Kind
-from data_access.webanno_tsv import Annotation, webanno_tsv_read_file
+from data_access.book_viewer_json import BookViewerJsonBuilder, Kind, parse_reference_from_url
+from data_access.gazetteer import GazetteerLookup
+from data_access.labels import LabelKindResolver, UnknownLabelError
+from data_access.webanno_tsv import Annotation, parse_page_number, webanno_tsv_read_file
 
 TSV_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'annotations'))
 LAYER = 'webanno.custom.LetterEntity'
 FIELD = 'value'
-PAGE_NUMBER_RE = re.compile('.*_page([0-9]{3}).tsv$')
-LABELS_TO_KINDS = [
-    (re.compile('^PER'), Kind.person),
-    (re.compile('^PLACE'), Kind.location),
-    (re.compile('^DATE'), Kind.timex),
-    (re.compile('^(OBJ|ORG|LIT|MISC)'), Kind.keyterm)
-]
-
-
-def parse_page_number(filename: str):
-    try:
-        return int(PAGE_NUMBER_RE.match(filename).group(1))
-    except (TypeError, AttributeError):
-        raise ValueError('Not a valid fileneme: %s' % filename)
+# Lists the input files of each book as last converted, for --incremental
+MANIFEST_FILE_NAME = '.manifest.json'
+# With --jobs, books are converted in parts of this many pages, merged afterwards
+PAGES_PER_JOB = 50
+KINDS = LabelKindResolver(Kind)
 
 
 def convert_annotation(
         builder: BookViewerJsonBuilder, 
         page_no: int, 
         a: Annotation, 
-        labels_to_kinds: dict = LABELS_TO_KINDS) -> None:
-    kind = next(kind for regex, kind in labels_to_kinds if regex.match(a.label))
-    builder.add_occurence(kind=kind, lemma=a.text, term=a.text, page=page_no)
+        kinds: LabelKindResolver = KINDS,
+        location: str = '') -> None:
+    """
+    Add the annotation to the builder, unless its label is unknown. Unknown labels are
+    collected by the resolver, see LabelKindResolver.check().
+    """
+    kind = kinds.kind(a.label, location)
+    if kind is not None:
+        builder.add_occurence(kind=kind, lemma=a.text, term=a.text, page=page_no)
 
 
 def convert_file(builder: BookViewerJsonBuilder, path: str):
     document = webanno_tsv_read_file(path)
-    page_no = parse_page_number(path) - 1  # book viewer counts from 0
+    page_no = parse_page_number(path, strict=True) - 1  # book viewer counts from 0
     for annotation in document.annotations_with_type(LAYER, FIELD):
-        convert_annotation(builder, page_no, annotation)
+        convert_annotation(builder, page_no, annotation, location=path)
 
 
-def convert_files(paths: Iterable[str]) -> str:
+def convert_pages(paths: Iterable[str]) -> Tuple[BookViewerJsonBuilder, Dict[str, List[str]]]:
+    """
+    :return: The builder filled with the pages and the files of each unknown label found.
+    """
     builder = BookViewerJsonBuilder()
     for path in paths:
         convert_file(builder, path)
-    return builder.to_json()
+    return builder, KINDS.take_unknown()
+
+
+def convert_files(paths: Iterable[str], compact: bool = False, backend: str = 'json') -> str:
+    """
+    :raises UnknownLabelError: if any of the files has labels without a book viewer kind
+    """
+    builder, unknown = convert_pages(paths)
+    if unknown:
+        raise UnknownLabelError(unknown)
+    return builder.to_json(compact=compact, backend=backend)
+
+
+def enrich_locations(builder: BookViewerJsonBuilder, gazetteer: GazetteerLookup):
+    """
+    Add a gazetteer reference and, if known, coordinates to each location found in the gazetteer.
+    """
+    for lemma in builder.lemmas(Kind.location):
+        place = gazetteer.resolve(lemma)
+        if place is None:
+            continue
+        builder.add_reference(Kind.location, lemma, *parse_reference_from_url(place.url))
+        if place.coordinates is not None:
+            builder.set_coordinates(Kind.location, lemma, place.coordinates)
+
+
+def file_states(paths: Iterable[str]) -> Dict[str, List[int]]:
+    """
+    :return: The modification time in ns and the size of each file, by its absolute path.
+    """
+    states = {}
+    for path in paths:
+        stat = os.stat(path)
+        states[os.path.abspath(path)] = [stat.st_mtime_ns, stat.st_size]
+    return states
+
+
+def read_manifest(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE_NAME), mode='r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
 
+def write_manifest(out_dir: str, manifest: dict) -> bool:
+    return _write_changed(out_dir, MANIFEST_FILE_NAME, json.dumps(manifest, indent=2, sort_keys=True))
 
-def write_output(out_dir: str, zenon_id: str, json: str):
+
+def write_output(out_dir: str, zenon_id: str, json: str) -> bool:
+    """
+    Write the json unless the file already has this content, so that its modification
+    time only changes with its content.
+
+    :return: Whether the file was written.
+    """
+    return _write_changed(out_dir, f'{zenon_id}.json', json)
+
+
+def _write_changed(out_dir: str, file_name: str, content: str) -> bool:
     os.makedirs(out_dir, exist_ok=True)
-    path = os.path.join(out_dir, f'{zenon_id}.json')
+    path = os.path.join(out_dir, file_name)
+    if _has_content(path, content):
+        return False
     with open(path, mode='w', encoding='utf-8') as f:
-        f.write(json)
+        f.write(content)
+    return True
+
+
+def _has_content(path: str, content: str) -> bool:
+    try:
+        # a different size is cheaper to detect than different content
+        if os.path.getsize(path) < len(content):
+            return False
+        with open(path, mode='r', encoding='utf-8') as f:
+            return f.read() == content
+    except (FileNotFoundError, UnicodeDecodeError):
+        return False
 
 
 def main(args: argparse.Namespace):
-    zenon_ids = os.listdir(args.input_dir)
-    ids_with_files = [(zid, glob.glob(os.path.join(args.input_dir, zid, '*.tsv'))) for zid in zenon_ids]
+    zenon_ids = sorted(os.listdir(args.input_dir))
+    # sorted, so that the items are always added in the same order
+    ids_with_files = [(zid, sorted(glob.glob(os.path.join(args.input_dir, zid, '*.tsv')))) for zid in zenon_ids]
+
+    gazetteer = None if args.no_gazetteer else GazetteerLookup(coordinates_path=args.coordinates)
+    options = [args.compact, args.json_backend, file_states(gazetteer.paths) if gazetteer else None]
+    previous = read_manifest(args.out_dir) if args.incremental else {}
+    manifest = {}
+    todo = []
     for zid, files in ids_with_files:
-        json = convert_files(files)
-        write_output(args.out_dir, zid, json)
+        manifest[zid] = {'options': options, 'files': file_states(files)}
+        unchanged = previous.get(zid) == manifest[zid]
+        if not (unchanged and os.path.exists(os.path.join(args.out_dir, f'{zid}.json'))):
+            todo.append((zid, files))
+
+    # consecutive pages of a book, so that merging the parts in order keeps the order of items
+    parts = [(zid, files[start:start + PAGES_PER_JOB])
+             for zid, files in todo for start in range(0, max(len(files), 1), PAGES_PER_JOB)]
+    # dicts with None values serve as ordered sets of the files
+    unknown: Dict[str, Dict[str, None]] = {}
+    converted = 0
+    with Pool(args.jobs) if args.jobs > 1 else nullcontext() as pool:
+        paths = [files for _, files in parts]
+        results = pool.imap(convert_pages, paths) if pool else map(convert_pages, paths)
+        for zid, book_parts in groupby(zip(parts, results), key=lambda part: part[0][0]):
+            builders = []
+            for _, (part_builder, part_unknown) in book_parts:
+                builders.append(part_builder)
+                for label, files in part_unknown.items():
+                    unknown.setdefault(label, {}).update(dict.fromkeys(files))
+                    # not written, so that the next run converts the book again
+                    manifest.pop(zid, None)
+            if zid in manifest:
+                converted += 1
+                builder = reduce(BookViewerJsonBuilder.merge, builders)
+                if gazetteer:
+                    enrich_locations(builder, gazetteer)
+                write_output(args.out_dir, zid, builder.to_json(compact=args.compact, backend=args.json_backend))
+    # written last, so that an interrupted run converts its books again
+    write_manifest(args.out_dir, manifest)
+    print(f'Converted {converted} of {len(ids_with_files)} books.')
+    if unknown:
+        raise UnknownLabelError({label: list(files) for label, files in unknown.items()})
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-i', '--input-dir', type=str, default=TSV_DIR,
                         help='Optional input directory. Defaults to ../data/annotations.')
+    parser.add_argument('--compact', action='store_true',
+                        help='Write the json without indentation.')
+    parser.add_argument('--json-backend', choices=['json', 'ujson', 'orjson'], default='json',
+                        help='The json library to write with, ujson and orjson have to be installed. '
+                             'orjson only writes compact json. Defaults to json.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='The number of processes converting books in parallel. Defaults to 1.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only convert books whose input files were added, removed or changed '
+                             '(modification time or size) since the last run with the same options.')
+    parser.add_argument('--no-gazetteer', action='store_true',
+                        help='Do not link locations to the gazetteer by the names in resources/geo-*.csv.')
+    parser.add_argument('--coordinates', type=str, default=None,
+                        help='Optional local snapshot of gazetteer coordinates, '
+                             'with lines "gazetteer id;longitude;latitude".')
     parser.add_argument('out_dir', type=pathlib.Path, help='The directory to write the output files to')
     main(parser.parse_args())
@@ -0,0 +1,71 @@
+import json
+import pickle
+import unittest
+
+from src.data_access import book_viewer_json
+from src.data_access.book_viewer_json import BookViewerJsonBuilder, Kind, item_id
+
+
+class BookViewerJsonBuilderTest(unittest.TestCase):
+
+    @staticmethod
+    def builder(occurrences) -> BookViewerJsonBuilder:
+        builder = BookViewerJsonBuilder()
+        for kind, lemma, page in occurrences:
+            builder.add_occurence(kind, lemma, page, lemma)
+        builder.add_reference(Kind.location, 'Rom', '2323295', 'https://gazetteer.dainst.org/place/2323295', 'gazetteer')
+        builder.add_reference(Kind.location, 'Rom', '', 'https://example.com/rom', 'example.com')
+        return builder
+
+    def build(self, occurrences) -> dict:
+        return json.loads(self.builder(occurrences).to_json())
+
+    def test_ids_are_stable(self):
+        self.assertEqual(item_id(Kind.person, 'Braun'), item_id(Kind.person, 'Braun'))
+        self.assertNotEqual(item_id(Kind.person, 'Braun'), item_id(Kind.keyterm, 'Braun'))
+        self.assertNotEqual(item_id(Kind.person, 'Braun'), item_id(Kind.person, 'Brunn'))
+
+        result = self.build([(Kind.person, 'Braun', 1)])
+        self.assertEqual(item_id(Kind.person, 'Braun'), result['persons']['items'][0]['id'])
+
+    def test_sets_are_sorted(self):
+        occurrences = [(Kind.location, 'Rom', page) for page in (12, 3, 7, 100)]
+        result = self.build(occurrences)
+        self.assertEqual(result, self.build(reversed(occurrences)))
+
+        rom = result['locations']['items'][0]
+        self.assertEqual([3, 7, 12, 100], rom['pages'])
+        self.assertEqual(['', '2323295'], [reference['id'] for reference in rom['references']])
+
+    def test_compact(self):
+        builder = self.builder([(Kind.person, 'Müller', 2), (Kind.location, 'Rom', 1), (Kind.timex, '1835', 1)])
+        builder.set_coordinates(Kind.location, 'Rom', (12.5, 41.9))
+        indented = builder.to_json()
+        self.assertIn('\n    "persons": {', indented)
+        compact = builder.to_json(compact=True)
+        self.assertNotIn('\n', compact)
+        self.assertEqual(json.loads(indented), json.loads(compact))
+        self.assertEqual(['persons', 'locations', 'keyterms', 'time_expressions'], list(json.loads(compact)))
+
+        for backend in ('orjson', 'ujson'):
+            if getattr(book_viewer_json, backend) is None:
+                with self.assertRaises(ValueError):
+                    builder.to_json(compact=True, backend=backend)
+            else:
+                self.assertEqual(json.loads(indented), json.loads(builder.to_json(compact=True, backend=backend)))
+
+    def test_merge(self):
+        occurrences = [(Kind.person, 'Braun', 1), (Kind.location, 'Rom', 1), (Kind.person, 'Braun', 2),
+                       (Kind.keyterm, 'Vase', 3), (Kind.location, 'Rom', 4), (Kind.person, 'Gerhard', 4)]
+        serial = self.builder(occurrences)
+
+        first, second = self.builder(occurrences[:3]), self.builder(occurrences[3:])
+        second.set_coordinates(Kind.location, 'Rom', (12.5, 41.9))
+        # partial builders are filled in other processes
+        merged = first.merge(pickle.loads(pickle.dumps(second)))
+        self.assertIs(first, merged)
+        serial.set_coordinates(Kind.location, 'Rom', (12.5, 41.9))
+        self.assertEqual(serial.to_json(), merged.to_json())
+
+        braun = json.loads(merged.to_json())['persons']['items'][0]
+        self.assertEqual((2, [1, 2]), (braun['count'], braun['pages']))
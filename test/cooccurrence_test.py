@@ -0,0 +1,94 @@
+import math
+import os
+import tempfile
+import unittest
+
+from src.data_access.cooccurrence import CooccurrenceMatrix, Scope
+from src.data_access.entity_index import EntityIndex
+from src.data_access.letters import NO_YEAR, parse_year, segment_letters
+
+from .test_util import write_entity_page
+
+HEADER = [('Braun', 'PERauthor'), ('an', None), ('Gerhard', 'PERaddressee'), ('Rom', 'PLACEfrom')]
+
+# book, page, sentences of (token, label) pairs; the first sentence of a page is its header
+PAGES = [
+    ('book1', 1, [HEADER + [('12.1.1835', 'DATEletter')],
+                  [('Panofka', 'PERmentioned'), ('und', None), ('Bunsen', 'PERmentioned')]]),
+    ('book1', 2, [HEADER + [('12 . 1 . 1835', 'DATEletter')],
+                  [('Panofka', 'PERmentioned'), ('in', None), ('Neapel', 'PLACEmentioned')]]),
+    ('book1', 3, [[('Bunsen', 'PERmentioned'), ('in', None), ('Neapel', 'PLACEmentioned')]]),
+    ('book1', 4, [HEADER + [('3. März', 'DATEletter')],
+                  [('Bunsen', 'PERmentioned'), ('in', None), ('Neapel', 'PLACEmentioned')]]),
+    ('book2', 1, [[('Neapel', 'PLACEmentioned'), ('am', None), ('5.5.1840', 'DATEletter')]]),
+]
+
+
+class CooccurrenceTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        files = []
+        for book, page, sentences in PAGES:
+            os.makedirs(os.path.join(self.tmp.name, book), exist_ok=True)
+            files.append(os.path.join(self.tmp.name, book, '%s_page%03d.tsv' % (book, page)))
+            write_entity_page(files[-1], sentences)
+        # not in page order, to check that letters follow the pages
+        self.index = EntityIndex.build(self.tmp.name, list(reversed(files)))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_parse_year(self):
+        self.assertEqual(1837, parse_year('18. Dezember 1837'))
+        self.assertEqual(NO_YEAR, parse_year('4/3 37'))
+        self.assertEqual(NO_YEAR, parse_year('18370'))
+
+    def test_segment_letters(self):
+        letters = segment_letters(self.index)
+        by_page = [letters.file_letters[self.index.files.index(os.path.join(book, '%s_page%03d.tsv' % (book, page)))]
+                   for book, page, _ in PAGES]
+
+        self.assertEqual([0, 0, 0, 1, 2], by_page)
+        # the second letter has no year in its header and gets the one of its predecessor
+        self.assertEqual([1835, 1835, 1840], letters.years.tolist())
+        self.assertEqual(['book1', 'book1', 'book2'], letters.books)
+
+    def test_neighbours(self):
+        pages = CooccurrenceMatrix.build(self.index, Scope.PAGE)
+        letters = CooccurrenceMatrix.build(self.index, Scope.LETTER)
+        sentences = CooccurrenceMatrix.build(self.index, Scope.SENTENCE)
+
+        self.assertEqual([('neapel', 'PLACEmentioned', 2)],
+                         [n[:3] for n in sentences.neighbours('Bunsen', 'PER', labels=['PLACE'])])
+        self.assertEqual([('neapel', 'PLACEmentioned', 1)],
+                         [n[:3] for n in sentences.neighbours('Panofka', labels=['PLACE'])])
+        self.assertEqual([('panofka', 'PERmentioned', 1)],
+                         [n[:3] for n in pages.neighbours('bunsen', labels=['PERmentioned'])])
+        self.assertEqual([('panofka', 'PERmentioned', 1)],
+                         [n[:3] for n in letters.neighbours('bunsen', labels=['PERmentioned'])])
+        self.assertEqual(4, pages.cooccurrences('neapel', 'PLACE')[pages.nodes('braun')].sum() +
+                         pages.cooccurrences('neapel', 'PLACE')[pages.nodes('bunsen')].sum())
+        self.assertEqual(2, letters.neighbours('Neapel', labels=['PERauthor'])[0].count)
+        self.assertEqual([], letters.neighbours('no such entity'))
+
+    def test_pmi(self):
+        pages = CooccurrenceMatrix.build(self.index, Scope.PAGE)
+        pmi = pages.pmi('panofka')
+        # 5 pages, panofka on 2, bunsen on 3, both on 1
+        self.assertAlmostEqual(math.log(1 * 5 / (2 * 3)), pmi[pages.nodes('bunsen')[0]])
+        self.assertEqual(-math.inf, pmi[pages.nodes('5.5.1840')[0]])
+
+        # the dates are on one of panofka's pages each
+        best = pages.neighbours('panofka', by_pmi=True, k=2)
+        self.assertEqual({'12.1.1835', '12 . 1 . 1835'}, {n.text for n in best})
+        self.assertAlmostEqual(math.log(5 / 2), best[0].score)
+
+    def test_years(self):
+        letters = CooccurrenceMatrix.build(self.index, Scope.LETTER)
+        self.assertEqual((1835, 1840), letters.year_range())
+
+        in_1835 = letters.years(1835)
+        self.assertEqual(2, in_1835.scope_count)
+        self.assertEqual([], in_1835.neighbours('5.5.1840'))
+        self.assertEqual(['neapel'], [n.text for n in letters.years(1836, 1850).neighbours('5.5.1840')])
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.data_access.entity_index import EntityIndex
+from src.data_access.webanno_tsv import entity_spans, webanno_tsv_read_file
+
+RESSOURCE_PATH = 'resources/test_iob_data_transformer/input'
+
+
+def source_path() -> str:
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), RESSOURCE_PATH))
+
+
+def source_files() -> list:
+    return sorted(os.path.join(source_path(), f) for f in os.listdir(source_path()))
+
+
+class EntityIndexTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.files = source_files()
+        self.index = EntityIndex.build(source_path(), self.files)
+
+    def test_has_all_entities_in_order(self):
+        expected = [(span.text.lower(), span.label, file_id)
+                    for file_id, f in enumerate(self.files)
+                    for span in entity_spans(webanno_tsv_read_file(f))]
+        actual = [(self.index.texts.values[t], self.index.labels[l], f)
+                  for t, l, f in zip(self.index.text_ids, self.index.label_ids, self.index.file_ids)]
+        self.assertEqual(expected, actual)
+
+    def test_frequencies(self):
+        frequencies, annotations = self.index.frequencies()
+        self.assertEqual(len(self.index), sum(frequencies.values()))
+        self.assertEqual(set(frequencies), set(annotations))
+        self.assertTrue(set(annotations.values()) <= {'PER', 'DATE', 'PLACE', 'OBJ', 'ORG', 'MISC', 'LIT'})
+
+        rows = np.asarray(self.index.file_ids) == 0
+        frequencies, _ = self.index.frequencies(rows)
+        self.assertEqual(int(rows.sum()), sum(frequencies.values()))
+
+    def test_query(self):
+        doc = webanno_tsv_read_file(self.files[0])
+        span = next(entity_spans(doc))
+        text, head, label = span.text, span.tokens[0].text, span.label
+        word = doc.tokens[0].text
+
+        entity_files = self.index.entity_files(text, label)
+        self.assertIn(0, entity_files)
+        self.assertEqual(entity_files.tolist(), self.index.entity_files(head.upper(), label).tolist())
+        self.assertEqual(0, len(self.index.entity_files('no such entity')))
+        self.assertEqual(sorted(set(entity_files.tolist())), entity_files.tolist())
+
+        word_entities = {text: label, word: None}
+        token_files = np.union1d(self.index.entity_files(word), self.index.token_files(word))
+        self.assertEqual(np.intersect1d(entity_files, token_files).tolist(),
+                         self.index.query(word_entities, conjunctive=True, entity_only=False).tolist())
+        self.assertEqual(np.union1d(entity_files, token_files).tolist(),
+                         self.index.query(word_entities, entity_only=False).tolist())
+        self.assertEqual(0, len(self.index.query({text: label, 'no such entity': None}, conjunctive=True)))
+
+    def test_file_rows(self):
+        file_ids = np.asarray(self.index.file_ids)
+        self.assertEqual(list(range(len(self.index))), self.index.file_rows(np.arange(len(self.files))).tolist())
+        self.assertEqual(np.flatnonzero((file_ids == 0) | (file_ids == 2)).tolist(),
+                         self.index.file_rows(np.array([0, 2])).tolist())
+        self.assertEqual([], self.index.file_rows(np.array([], dtype=np.int32)).tolist())
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.index.save(tmp)
+            loaded = EntityIndex.load(tmp)
+
+            self.assertTrue(loaded.is_current(self.files))
+            self.assertFalse(loaded.is_current(self.files[1:]))
+            self.assertEqual(self.index.frequencies(), loaded.frequencies())
+            self.assertEqual(self.index.texts.values, loaded.texts.values)
+            self.assertEqual(self.index.word_ids.tolist(), loaded.word_ids.tolist())
+            self.assertEqual(self.index.posting_files.tolist(), loaded.posting_files.tolist())
+            del loaded
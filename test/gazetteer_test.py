@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from src.data_access.gazetteer import GazetteerLookup, name_key, read_coordinates
+
+NAMES = ['Rom;4050471-2;2323295\n', 'Neapel;4041476-0;2338719\n', 'Köln;4031483-2;2051668\n', 'Leer;;\n']
+COORDINATES = ['gazetteer_id;longitude;latitude\n', '2323295;12.48;41.89\n', '2338719;;\n']
+
+
+class GazetteerLookupTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.names_path = os.path.join(self.tmp.name, 'names.csv')
+        self.coordinates_path = os.path.join(self.tmp.name, 'coordinates.csv')
+        with open(self.names_path, mode='w', encoding='utf-8') as f:
+            f.writelines(NAMES)
+        with open(self.coordinates_path, mode='w', encoding='utf-8') as f:
+            f.writelines(COORDINATES)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_name_key(self):
+        self.assertEqual('rom', name_key(' Rom ,'))
+        self.assertEqual('san marco', name_key('San  Marco'))
+
+    def test_read_coordinates(self):
+        self.assertEqual({'2323295': (12.48, 41.89)}, read_coordinates(self.coordinates_path))
+
+    def test_resolve(self):
+        gazetteer = GazetteerLookup([self.names_path], self.coordinates_path)
+        rom = gazetteer.resolve('Rom')
+        self.assertEqual(('2323295', 'https://gazetteer.dainst.org/place/2323295', (12.48, 41.89)), rom)
+        self.assertIs(rom, gazetteer.resolve('Rom'))
+        self.assertEqual(rom, gazetteer.resolve('ROM.'))
+        self.assertIsNone(gazetteer.resolve('Neapel').coordinates)
+        self.assertEqual('2051668', gazetteer.resolve('köln').id)
+        self.assertIsNone(gazetteer.resolve('Leer'))
+        self.assertIsNone(gazetteer.resolve('Berlin'))
+
+    def test_resource_files(self):
+        gazetteer = GazetteerLookup()
+        self.assertEqual('2323295', gazetteer.resolve('Rom').id)
+        self.assertIsNone(gazetteer.resolve('Rom').coordinates)
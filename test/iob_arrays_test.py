@@ -0,0 +1,51 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.data_access.iob_arrays import (IobArraysBuilder, IobVocabulary,
+                                        load_iob_arrays, save_iob_arrays)
+
+IOB_TEXT = '\n'.join([
+    'Braun\tB-PERauthor\tB-PER',
+    'an\tO\tO',
+    'Gerhard\tB-PERaddressee\tB-PER',
+    '',
+    'Rom\tB-PLACEfrom\tB-PLACE',
+    'an\tO\tO',
+    '',
+    ''
+])
+
+
+class IobArraysTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.vocabulary = IobVocabulary()
+        builder = IobArraysBuilder(self.vocabulary)
+        builder.add_text(IOB_TEXT)
+        self.arrays = builder.build()
+
+    def test_builds_ids_and_offsets(self):
+        self.assertEqual(['Braun', 'an', 'Gerhard', 'Rom'], self.vocabulary.tokens.values)
+        self.assertEqual([0, 1, 2, 3, 1], self.arrays.tokens.tolist())
+        self.assertEqual(['B-PER', 'O', 'B-PER', 'B-PLACE', 'O'],
+                         [self.vocabulary.coarse_tags.values[i] for i in self.arrays.coarse_tags])
+        self.assertEqual([0, 3, 5], self.arrays.sentence_offsets.tolist())
+        self.assertEqual(2, self.arrays.sentence_count)
+        self.assertEqual([3, 1], self.arrays.tokens[self.arrays.sentence(1)].tolist())
+        self.assertEqual(np.int32, self.arrays.tokens.dtype)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            save_iob_arrays(self.arrays, tmp, 'train')
+            self.vocabulary.save(tmp)
+
+            loaded = load_iob_arrays(tmp, 'train')
+            vocabulary = IobVocabulary.load(tmp)
+
+            self.assertIsInstance(loaded.tokens, np.memmap)
+            for expected, actual in zip(self.arrays, loaded):
+                self.assertEqual(expected.tolist(), actual.tolist())
+            self.assertEqual(self.vocabulary.fine_tags.values, vocabulary.fine_tags.values)
+            del loaded
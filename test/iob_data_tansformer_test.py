@@ -1,8 +1,19 @@
+import gzip
+import json
 import os
+import shutil
+import tempfile
 import unittest
+from typing import List
+from unittest import mock
 
+from src.data_access.iob_arrays import IobVocabulary, load_iob_arrays
 from src.data_access.iob_data_transformer import (DataSplit,
                                                   WebAnnoIobDataTransformer)
+from src.data_access.webanno_tsv import Annotation, Document
+
+TARGET_LAYER = 'webanno.custom.LetterEntity'
+TARGET_FIELD = 'value'
 
 RESSOURCE_PATH='resources/test_iob_data_transformer/'
 
@@ -34,6 +45,23 @@ class DataSplitTest(unittest.TestCase):
         self.assertEqual(['2', '3', '4', '5', '6'], data_split.test_split(data))
         self.assertEqual(['7', '8', '9', '10'], data_split.dev_split(data))
 
+    def test_weighted_splits(self):
+        data = ['1', '2', '3', '4', '5', '6']
+        weights = [10, 60, 5, 5, 10, 10]
+
+        self.assertEqual((['1', '2', '3', '4'], ['5'], ['6']), DataSplit().weighted_splits(data, weights))
+        self.assertEqual((['1', '2'], ['3', '4'], ['5', '6']),
+                         DataSplit(0.5, 0.3, 0.2).weighted_splits(data, weights))
+
+    def test_weighted_splits_keep_groups_together(self):
+        data = ['a1', 'b1', 'a2', 'c1', 'b2', 'd1']
+        weights = [30, 10, 30, 10, 10, 10]
+        groups = ['a', 'b', 'a', 'c', 'b', 'd']
+
+        self.assertEqual((['a1', 'a2', 'b1', 'b2'], ['c1'], ['d1']),
+                         DataSplit().weighted_splits(data, weights, groups))
+
+
 class WebAnnoIobDataTransformerTest(unittest.TestCase):
 
     def test_transform(self):
@@ -51,3 +79,160 @@ class WebAnnoIobDataTransformerTest(unittest.TestCase):
         os.remove(os.path.join(output_path, 'test.txt'))
         os.remove(os.path.join(output_path, 'dev.txt'))
 
+
+    def test_transform_in_parallel_gives_same_output(self):
+        source_path = os.path.abspath(os.path.join(os.path.dirname(__file__), RESSOURCE_PATH, 'input'))
+        transformer = WebAnnoIobDataTransformer()
+
+        with tempfile.TemporaryDirectory() as sequential, tempfile.TemporaryDirectory() as parallel:
+            transformer.transform(source_path=source_path, output_path=sequential)
+            transformer.transform(source_path=source_path, output_path=parallel, processes=2)
+            for file_name in ['train.txt', 'test.txt', 'dev.txt']:
+                with open(os.path.join(sequential, file_name), encoding='utf-8') as f:
+                    expected = f.read()
+                with open(os.path.join(parallel, file_name), encoding='utf-8') as f:
+                    self.assertEqual(expected, f.read())
+
+    def test_transform_reuses_cached_fragments(self):
+        source_files = os.path.abspath(os.path.join(os.path.dirname(__file__), RESSOURCE_PATH, 'input'))
+        transformer = WebAnnoIobDataTransformer()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source_path = os.path.join(tmp, 'input')
+            shutil.copytree(source_files, source_path)
+            cache_dir = os.path.join(tmp, 'cache')
+
+            counts = transformer.transform(source_path=source_path, output_path=tmp, cache_dir=cache_dir)
+            # some of the input files have the same content and share a fragment
+            self.assertEqual(10, counts.reused + counts.converted)
+            self.assertLess(counts.reused, counts.converted)
+
+            changed_file = os.path.join(source_path, 'test_input_3.tsv')
+            with open(changed_file, encoding='utf-8') as f:
+                content = f.read()
+            with open(changed_file, mode='w', encoding='utf-8') as f:
+                f.write(content.replace('DATEletter', 'DATEmentioned'))
+            self.assertEqual((9, 1), transformer.transform(source_path=source_path, output_path=tmp,
+                                                           cache_dir=cache_dir))
+
+            cached_outputs = self.read_outputs(tmp)
+            transformer.transform(source_path=source_path, output_path=tmp)
+            self.assertEqual(self.read_outputs(tmp), cached_outputs)
+
+    def test_transform_sharded_and_compressed(self):
+        source_path = os.path.abspath(os.path.join(os.path.dirname(__file__), RESSOURCE_PATH, 'input'))
+
+        with tempfile.TemporaryDirectory() as plain, tempfile.TemporaryDirectory() as sharded:
+            WebAnnoIobDataTransformer(balance_tokens=True).transform(source_path=source_path, output_path=plain)
+            WebAnnoIobDataTransformer(balance_tokens=True, shard_tokens=20, compress=True).transform(
+                source_path=source_path, output_path=sharded)
+
+            with open(os.path.join(sharded, 'manifest.json'), encoding='utf-8') as f:
+                manifest = json.load(f)
+            for file_name, expected in zip(['train.txt', 'test.txt', 'dev.txt'], self.read_outputs(plain)):
+                shards = manifest[file_name]
+                self.assertEqual(len(expected.splitlines()),
+                                 sum(s['tokens'] + s['sentences'] for s in shards))
+                text = ''
+                for shard in shards:
+                    with gzip.open(os.path.join(sharded, shard['file']), mode='rt', encoding='utf-8') as f:
+                        text += f.read()
+                self.assertEqual(expected, text)
+            self.assertGreater(len(manifest['train.txt']), 1)
+
+    def test_transform_removes_outputs_of_other_modes(self):
+        source_path = os.path.abspath(os.path.join(os.path.dirname(__file__), RESSOURCE_PATH, 'input'))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            WebAnnoIobDataTransformer(compress=True).transform(source_path=source_path, output_path=tmp)
+            self.assertEqual(['dev.txt.gz', 'manifest.json', 'test.txt.gz', 'train.txt.gz'], sorted(os.listdir(tmp)))
+
+            WebAnnoIobDataTransformer().transform(source_path=source_path, output_path=tmp)
+            self.assertEqual(['dev.txt', 'test.txt', 'train.txt'], sorted(os.listdir(tmp)))
+
+            WebAnnoIobDataTransformer(shard_tokens=100000).transform(source_path=source_path, output_path=tmp)
+            self.assertEqual(['dev-0000.txt', 'manifest.json', 'test-0000.txt', 'train-0000.txt'],
+                             sorted(os.listdir(tmp)))
+
+    def test_transform_group_by_book(self):
+        source_files = os.path.abspath(os.path.join(os.path.dirname(__file__), RESSOURCE_PATH, 'input'))
+        written = {}
+        write_data = WebAnnoIobDataTransformer._write_data
+
+        def record_split_files(transformer, fragments, output_dir, file_name, *args):
+            written[file_name] = [f for f, _, _ in fragments]
+            return write_data(transformer, fragments, output_dir, file_name, *args)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # five books of two pages each
+            source_path = os.path.join(tmp, 'input')
+            for i, file_name in enumerate(sorted(os.listdir(source_files))):
+                book = os.path.join(source_path, 'book%d' % (i // 2))
+                os.makedirs(book, exist_ok=True)
+                shutil.copy(os.path.join(source_files, file_name), book)
+
+            with mock.patch.object(WebAnnoIobDataTransformer, '_write_data', record_split_files):
+                WebAnnoIobDataTransformer(group_by_book=True).transform(source_path=source_path,
+                                                                       output_path=os.path.join(tmp, 'output'))
+
+        books = {split: {os.path.dirname(f) for f in files} for split, files in written.items()}
+        self.assertEqual(10, sum(len(files) for files in written.values()))
+        self.assertGreater(len([split for split in books.values() if split]), 1)
+        self.assertEqual(5, len(set.union(*books.values())))
+        self.assertEqual(5, sum(len(split) for split in books.values()))
+
+    def test_transform_arrays_match_text_output(self):
+        source_path = os.path.abspath(os.path.join(os.path.dirname(__file__), RESSOURCE_PATH, 'input'))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            WebAnnoIobDataTransformer(arrays=True).transform(source_path=source_path, output_path=tmp)
+            vocabulary = IobVocabulary.load(tmp)
+            for file_name, text in zip(['train.txt', 'test.txt', 'dev.txt'], self.read_outputs(tmp)):
+                arrays = load_iob_arrays(tmp, os.path.splitext(file_name)[0])
+                rows = [line.split('\t') for line in text.split('\n') if line]
+                self.assertEqual([row[0] for row in rows], [vocabulary.tokens.values[i] for i in arrays.tokens])
+                self.assertEqual([row[1] for row in rows], [vocabulary.fine_tags.values[i] for i in arrays.fine_tags])
+                self.assertEqual([row[2] for row in rows],
+                                 [vocabulary.coarse_tags.values[i] for i in arrays.coarse_tags])
+
+                # a sentence ends at each empty line, empty sentences have no offset
+                offsets, tokens = [0], 0
+                for line in text.split('\n'):
+                    if line:
+                        tokens += 1
+                    elif tokens > offsets[-1]:
+                        offsets.append(tokens)
+                self.assertEqual(offsets, arrays.sentence_offsets.tolist())
+                self.assertGreater(arrays.sentence_count, 0)
+
+    @staticmethod
+    def read_outputs(output_path: str) -> List[str]:
+        outputs = []
+        for file_name in ['train.txt', 'test.txt', 'dev.txt']:
+            with open(os.path.join(output_path, file_name), encoding='utf-8') as f:
+                outputs.append(f.read())
+        return outputs
+
+    def test_iob_text(self):
+        doc = Document()
+        doc.add_tokens_as_sentence(['Braun', 'an', 'Eduard', 'Gerhard', '.'])
+        doc.add_tokens_as_sentence(['Rom', 'Rom'])
+        tokens = doc.tokens
+        doc.add_annotation(Annotation(tokens[0:1], TARGET_LAYER, TARGET_FIELD, 'PERauthor'))
+        doc.add_annotation(Annotation(tokens[2:4], TARGET_LAYER, TARGET_FIELD, 'PERaddressee', 1))
+        doc.add_annotation(Annotation(tokens[5:6], TARGET_LAYER, TARGET_FIELD, 'PLACEfrom'))
+        doc.add_annotation(Annotation(tokens[6:7], TARGET_LAYER, TARGET_FIELD, 'PLACEfrom'))
+
+        expected = [
+            'Braun\tB-PERauthor\tB-PER',
+            'an\tO\tO',
+            'Eduard\tB-PERaddressee\tB-PER',
+            'Gerhard\tI-PERaddressee\tI-PER',
+            '.\tO\tO',
+            '',
+            'Rom\tB-PLACEfrom\tB-PLACE',
+            'Rom\tB-PLACEfrom\tB-PLACE',
+            '',
+            ''
+        ]
+        self.assertEqual(expected, WebAnnoIobDataTransformer()._iob_text(doc).split('\n'))
@@ -0,0 +1,75 @@
+import os.path
+import unittest
+
+from src.data_access.book_viewer_json import Kind
+from src.data_access.labels import (FINE_TO_COARSE, LABELS, LabelKindResolver,
+                                    LabelRegistry, UnknownLabelError)
+from src.data_access.webanno_tsv import webanno_tsv_read_labels
+
+from .test_util import test_file
+
+
+class LabelRegistryTest(unittest.TestCase):
+
+    def test_lookups(self):
+        self.assertEqual('PER', LABELS.coarse('PERauthor'))
+        self.assertEqual('PER', LABELS.coarse('PER'))
+        self.assertEqual(LABELS.coarse_id('PLACEfrom'), LABELS.coarse_id('PLACE'))
+        self.assertEqual('#40ab02', LABELS.color('PLACEto'))
+        self.assertEqual('grey', LABELS.color('THE', default='grey'))
+        self.assertEqual('keyterm', LABELS.kind_name('OBJtopography'))
+        self.assertEqual('timex', LABELS.kind_name('DATEletter'))
+        self.assertIn('LIT', LABELS)
+        self.assertNotIn('TIME', LABELS)
+
+    def test_unknown_label_is_key_error(self):
+        with self.assertRaises(KeyError):
+            LABELS.coarse('TIME')
+
+    def test_custom_mapping(self):
+        registry = LabelRegistry({'A1': 'A', 'B1': 'B', 'A2': 'A'})
+        self.assertEqual(['A1', 'B1', 'A2'], registry.fine_labels)
+        self.assertEqual(['A', 'B'], registry.coarse_labels)
+        self.assertEqual('A', registry.coarse('A2'))
+        self.assertIsNone(registry.color('A2'))
+
+    def test_validate_reports_all_unknown_labels(self):
+        labels = [('PERauthor', 'a'), ('TIME', 'a'), ('THE', 'b'), ('TIME', 'c')]
+        with self.assertRaises(UnknownLabelError) as context:
+            LABELS.validate(labels)
+        self.assertEqual(['THE', 'TIME'], context.exception.labels)
+        self.assertEqual({'THE': ['b'], 'TIME': ['a', 'c']}, context.exception.locations)
+
+    def test_validate_files(self):
+        path = test_file(os.path.join('test_input_webanno_tsv', 'test_input.tsv'))
+        read_labels = lambda p: webanno_tsv_read_labels(p, 'webanno.custom.LetterEntity', 'value')
+        LABELS.validate_files([path], read_labels)
+
+        mapping = {label: coarse for label, coarse in FINE_TO_COARSE.items() if label != 'PERmentioned'}
+        with self.assertRaises(UnknownLabelError) as context:
+            LabelRegistry(mapping).validate_files([path, path], read_labels)
+        self.assertEqual({'PERmentioned': [path]}, context.exception.locations)
+
+
+class LabelKindResolverTest(unittest.TestCase):
+
+    def test_kinds(self):
+        kinds = LabelKindResolver(Kind)
+        self.assertEqual(Kind.person, kinds.kind('PERauthor'))
+        self.assertEqual(Kind.location, kinds.kind('PLACE'))
+        self.assertEqual(Kind.timex, kinds.kind('DATEletter'))
+        self.assertEqual(Kind.keyterm, kinds.kind('LIT'))
+        # labels that are not in the registry get the kind of the coarse label they start with
+        self.assertEqual(Kind.keyterm, kinds.kind('ORGsender'))
+        self.assertIsNone(kinds.kind('B-PER'))
+        kinds.take_unknown()
+        kinds.check()
+
+    def test_check_reports_all_unknown_labels(self):
+        kinds = LabelKindResolver(Kind)
+        for label, location in [('TIME', 'a'), ('PER', 'a'), ('XPER', 'b'), ('TIME', 'c'), ('TIME', 'a')]:
+            kinds.kind(label, location)
+        with self.assertRaises(UnknownLabelError) as context:
+            kinds.check()
+        self.assertEqual({'TIME': ['a', 'c'], 'XPER': ['b']}, context.exception.locations)
+        kinds.check()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.data_access import letter_stats
+from src.data_access.entity_index import EntityIndex
+from src.data_access.letter_stats import LetterStats
+from src.data_access.letters import NO_YEAR
+
+from .test_util import write_entity_page
+
+BRAUN = '116415738'
+GERHARD = '118717030'
+
+HEADER = [('Braun', 'PERauthor'), ('an', None), ('Gerhard', 'PERaddressee')]
+
+# book, page, sentences of (token, label) pairs; the first sentence of a page is its header
+PAGES = [
+    ('000880098', 3, [HEADER + [('1.2.1833', 'DATEletter')],
+                      [('Panofka', 'PERmentioned'), ('in', None), ('Neapel', 'PLACEmentioned')]]),
+    ('000880098', 4, [HEADER + [('1.2.1833', 'DATEletter')],
+                      [('Bunsen', 'PERmentioned')]]),
+    ('000880098', 7, [HEADER + [('9.9.1834', 'DATEletter')],
+                      [('Vase', 'OBJ')]]),
+    # this book has two pairs of correspondents in the same years
+    ('001315090', 1, [[('Lepsius', 'PERauthor'), ('1.1.1880', 'DATEletter')]]),
+]
+
+
+class LetterStatsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        files = []
+        for book, page, sentences in PAGES:
+            os.makedirs(os.path.join(self.tmp.name, book), exist_ok=True)
+            files.append(os.path.join(self.tmp.name, book, '%s_page%03d.tsv' % (book, page)))
+            write_entity_page(files[-1], sentences)
+        self.stats = LetterStats.build(EntityIndex.build(self.tmp.name, files))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_build(self):
+        table = self.stats.table
+        self.assertEqual(['000880098', '000880098', '001315090'], table['book'].tolist())
+        self.assertEqual([(3, 4, 2), (7, 7, 1), (1, 1, 1)],
+                         list(zip(table['first_page'], table['last_page'], table['pages'])))
+        self.assertEqual([BRAUN, BRAUN, ''], table['author'].tolist())
+        self.assertEqual([GERHARD, GERHARD, ''], table['addressee'].tolist())
+        self.assertEqual([1833, 1834, 1880], table['year'].tolist())
+        self.assertEqual([2, 1, 1], table['PERauthor'].tolist())
+        self.assertEqual([2, 0, 0], table['PERmentioned'].tolist())
+        self.assertEqual([0, 0, 0], table['LIT'].tolist())
+
+    def test_select_and_aggregate(self):
+        self.assertEqual([True, True, False], self.stats.select(author=BRAUN).tolist())
+        self.assertEqual([False, True, True], self.stats.select(first_year=1834).tolist())
+        self.assertEqual([True, False, False], self.stats.select(last_year=1833, addressee=GERHARD).tolist())
+
+        self.assertEqual([9, 4, 2], self.stats.entity_counts().tolist())
+        self.assertEqual([1, 1], self.stats.entity_counts(['OBJ', 'PLACEmentioned'],
+                                                          self.stats.select(book='000880098')).tolist())
+
+        years, counts = self.stats.per_year(['PER'])
+        self.assertEqual(([1833, 1834, 1880], [6, 2, 1]), (years.tolist(), counts.tolist()))
+        years, counts = self.stats.per_year(mask=self.stats.select(author=BRAUN))
+        self.assertEqual(([1833, 1834], [1, 1]), (years.tolist(), counts.tolist()))
+
+        self.assertEqual({(BRAUN, GERHARD): 2, ('', ''): 1}, self.stats.per_pair())
+        self.assertEqual({(BRAUN, GERHARD): 1}, self.stats.per_pair(['PLACE'], self.stats.select(book='000880098')))
+
+    def test_unknown_years_are_left_out_of_year_selections(self):
+        self.stats.table['year'][2] = NO_YEAR
+        self.assertEqual([True, True, False], self.stats.select(last_year=2000).tolist())
+        self.assertEqual([1833, 1834], self.stats.per_year()[0].tolist())
+
+    def test_save_and_load_without_pyarrow(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(letter_stats, 'pyarrow', None):
+            path = self.stats.save(tmp)
+            self.assertTrue(path.endswith('.npy'))
+            self.assertTrue(LetterStats.exists(tmp))
+            self.assertEqual(self.stats.table.tolist(), LetterStats.load(tmp).table.tolist())
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+from src.data_access.normalization import (EntityNormalizer, canonical,
+                                           cluster_keys, jaccard, trigrams)
+
+
+class CanonicalTest(unittest.TestCase):
+
+    def test_folds_variants(self):
+        self.assertEqual(canonical('Müller', 'PER'), canonical('Mueller', 'PERmentioned'))
+        self.assertEqual(canonical('Thal', 'PLACE'), canonical('tal', 'PLACE'))
+        self.assertEqual(canonical('Cöln', 'PLACE'), canonical('Köln', 'PLACE'))
+        self.assertEqual(canonical('Straße', 'PLACE'), canonical('Strasse', 'PLACE'))
+        self.assertEqual(canonical('Caſſel', 'PLACE'), canonical('Cassel', 'PLACE'))
+        self.assertEqual(canonical('Gerh- ard', 'PER'), canonical('Gerhard', 'PER'))
+        self.assertEqual(canonical('Berlin ,', 'PLACE'), canonical('berlin', 'PLACE'))
+        self.assertEqual(canonical('città', 'PLACE'), canonical('citta', 'PLACE'))
+
+    def test_dates_keep_their_spelling(self):
+        self.assertEqual('12.1.1835', canonical('12 . 1 . 1835', 'DATEletter'))
+        self.assertEqual('3.märz', canonical('3. März', 'DATE'))
+        self.assertNotEqual(canonical('12.1.1835', 'DATE'), canonical('13.1.1835', 'DATE'))
+
+
+class ClusterKeysTest(unittest.TestCase):
+
+    def test_joins_most_frequent_similar_key(self):
+        counts = {'civitavecchia': 10, 'civittavecchia': 2, 'civitavechia': 1, 'corneto': 5, 'cornetto': 1}
+        heads = cluster_keys(counts, 0.7)
+        self.assertEqual({'civitavecchia': 'civitavecchia', 'civittavecchia': 'civitavecchia',
+                          'civitavechia': 'civitavecchia', 'corneto': 'corneto', 'cornetto': 'corneto'}, heads)
+
+    def test_finds_all_pairs_above_similarity(self):
+        # prefix filtering must not miss any pair that a comparison of all pairs finds
+        counts = {'braun': 5, 'brauns': 4, 'braunn': 3, 'baun': 2, 'brunn': 2, 'bruun': 1}
+        for similarity in (0.4, 0.5, 0.6, 0.8):
+            heads = cluster_keys(counts, similarity)
+            for key, head in heads.items():
+                self.assertEqual(head, heads[head])
+            self.assertEqual(heads, self._all_pairs(counts, similarity))
+
+    @staticmethod
+    def _all_pairs(counts, similarity):
+        heads = {}
+        for key in sorted(counts, key=lambda k: (-counts[k], k)):
+            scored = [(jaccard(set(trigrams(key)), set(trigrams(head))), head) for head in sorted(set(heads.values()))]
+            scored = [(s, h) for s, h in scored if s >= similarity]
+            # the most similar, the first head on ties
+            heads[key] = max(scored, key=lambda x: x[0])[1] if scored else key
+        return heads
+
+
+class EntityNormalizerTest(unittest.TestCase):
+
+    FREQUENCIES = {'köln': 3, 'cöln': 1, 'civitavecchia': 4, 'civittavecchia': 1, '12.1.1835': 1, '12 . 1 . 1835': 2}
+    ANNOTATIONS = {'köln': 'PLACE', 'cöln': 'PLACE', 'civitavecchia': 'PLACE', 'civittavecchia': 'PLACE',
+                   '12.1.1835': 'DATE', '12 . 1 . 1835': 'DATE'}
+
+    def test_merge(self):
+        frequencies, annotations = EntityNormalizer().merge(self.FREQUENCIES, self.ANNOTATIONS)
+        self.assertEqual({'köln': 4, 'civitavecchia': 4, 'civittavecchia': 1, '12 . 1 . 1835': 3}, frequencies)
+        self.assertEqual('DATE', annotations['12 . 1 . 1835'])
+
+        frequencies, _ = EntityNormalizer(similarity=0.7).merge(self.FREQUENCIES, self.ANNOTATIONS)
+        self.assertEqual({'köln': 4, 'civitavecchia': 5, '12 . 1 . 1835': 3}, frequencies)
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'normalization.json')
+            normalizer = EntityNormalizer(path, similarity=0.7)
+            expected = normalizer.merge(self.FREQUENCIES, self.ANNOTATIONS)
+            normalizer.save()
+            modified = os.stat(path).st_mtime_ns
+
+            cached = EntityNormalizer(path, similarity=0.7)
+            self.assertEqual(expected, cached.merge(self.FREQUENCIES, self.ANNOTATIONS))
+            self.assertEqual('civitavecchia', cached.key('civittavecchia', 'PLACEmentioned'))
+            cached.save()
+            self.assertEqual(modified, os.stat(path).st_mtime_ns)
+
+            # clusters of another similarity are not used
+            self.assertEqual('civittavecchia', EntityNormalizer(path).key('civittavecchia', 'PLACE'))
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+from src.data_access.ocr_pages import PAGE_SEP, count_pages, read_pages
+
+
+class ReadPagesTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write_file(self, content: str) -> str:
+        path = os.path.join(self.tmp_dir.name, 'book.txt')
+        with open(path, mode='w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_same_pages_as_split(self):
+        contents = [
+            'Seite eins\nmit Umlauten: äöü ß\fSeite zwei\f\fSeite vier\n',
+            'Eine Seite',
+            '\fnach einer leeren Seite\f',
+            '',
+        ]
+        for content in contents:
+            path = self.write_file(content)
+            expected = list(enumerate(content.split(PAGE_SEP), start=1))
+            self.assertEqual(expected, list(read_pages(path)))
+            self.assertEqual(len(expected), count_pages(path))
+
+    def test_reads_lazily(self):
+        path = self.write_file('eins\fzwei\fdrei')
+        pages = read_pages(path)
+        self.assertEqual((1, 'eins'), next(pages))
+        self.assertEqual((2, 'zwei'), next(pages))
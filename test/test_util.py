@@ -1,5 +1,25 @@
 import os
 
+from src.data_access.webanno_tsv import Annotation, Document
+
+ENTITY_LAYER = 'webanno.custom.LetterEntity'
+ENTITY_FIELD = 'value'
+
 
 def test_file(name) -> str:
     return os.path.join(os.path.dirname(__file__), 'resources', name)
+
+
+def write_entity_page(path: str, sentences: list):
+    """
+    Write a WebAnno TSV file with the sentences, given as lists of (token, label) pairs,
+    with single token entity annotations for the tokens with a label.
+    """
+    doc = Document([(ENTITY_LAYER, [ENTITY_FIELD])])
+    for sentence in sentences:
+        tokens = doc.add_tokens_as_sentence([token for token, _ in sentence]).tokens
+        for token, (_, label) in zip(tokens, sentence):
+            if label:
+                doc.add_annotation(Annotation([token], ENTITY_LAYER, ENTITY_FIELD, label))
+    with open(path, mode='w', encoding='utf-8') as f:
+        f.write(doc.tsv())
@@ -0,0 +1,66 @@
+import difflib
+import unittest
+
+from src.data_access.token_matching import FuzzyScorer, Match, TokenMatcher
+from src.data_access.util import subsequences_of_length
+
+TEXTS = ['Braun', 'an', 'Gerhard', 'Rom', ',', '23', '.', 'Juli', '1835', 'Braun', 'an', 'Gerhard', '.']
+
+
+class TokenMatcherExactTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.matcher = TokenMatcher(TEXTS)
+
+    def test_occurrences(self):
+        self.assertEqual([0, 9], list(self.matcher.occurrences(['Braun', 'an', 'Gerhard'])))
+        self.assertEqual([3], list(self.matcher.occurrences(['Rom'])))
+        self.assertEqual([], list(self.matcher.occurrences(['Berlin'])))
+        self.assertEqual([], list(self.matcher.occurrences([])))
+        self.assertEqual([], list(self.matcher.occurrences(TEXTS + ['.'])))
+
+    def test_exact_match_in_window(self):
+        needle = ['Braun', 'an']
+        self.assertEqual(Match(0, 2, 1.0), self.matcher.exact_match(needle, 0, len(TEXTS)))
+        self.assertEqual(Match(9, 11, 1.0), self.matcher.exact_match(needle, 1, len(TEXTS)))
+        self.assertIsNone(self.matcher.exact_match(needle, 1, 10))
+        self.assertIsNone(self.matcher.exact_match(needle, 5, 3))
+
+    def test_window_has_slice_semantics(self):
+        self.assertEqual(Match(0, 2, 1.0), self.matcher.exact_match(['Braun', 'an'], 0, -2))
+        self.assertIsNone(self.matcher.exact_match(['Gerhard', '.'], 0, -1))
+
+
+class TokenMatcherInexactTest(unittest.TestCase):
+
+    @staticmethod
+    def difflib_match(needle, haystack, cutoff):
+        lengths = [len(needle) + i for i in [-2, -1, 0, 1, 2, 3]]
+        sequences = subsequences_of_length(haystack, *lengths)
+        candidates = [''.join(s) for s in sequences]
+        matches = difflib.get_close_matches(''.join(needle), candidates, 1, cutoff)
+        return sequences[candidates.index(matches[0])] if matches else []
+
+    def test_same_results_as_difflib(self):
+        matcher = TokenMatcher(TEXTS)
+        needles = [['Gerhardt'], ['Brau', 'an'], ['23', ',', 'Juli'], ['Juni', '1835'], ['Berlin'], ['an']]
+        for needle in needles:
+            scorer = FuzzyScorer(needle)
+            for cutoff in [0.8, 0.72, 0.65, 0.5]:
+                for start, stop in [(0, len(TEXTS)), (2, 9), (4, 13), (6, 6)]:
+                    expected = self.difflib_match(needle, TEXTS[start:stop], cutoff)
+                    match = matcher.inexact_match(scorer, start, stop, cutoff)
+                    actual = TEXTS[match.start:match.stop] if match else []
+                    self.assertEqual(expected, actual, f'{needle} in {start}:{stop} with cutoff {cutoff}')
+
+    def test_prefers_earliest_of_equal_candidates(self):
+        matcher = TokenMatcher(TEXTS)
+        match = matcher.inexact_match(FuzzyScorer(['Braun', 'am']), 0, len(TEXTS), 0.8)
+        self.assertEqual((0, 2), (match.start, match.stop))
+
+    def test_scorer_memoizes_across_cutoffs(self):
+        scorer = FuzzyScorer(['Gerhard'])
+        self.assertIsNone(scorer.score('Rom', 0.8))
+        self.assertIsNone(scorer.score('Rom', 0.5))
+        self.assertAlmostEqual(difflib.SequenceMatcher(None, 'Rom', 'Gerhard').ratio(), scorer.score('Rom', 0.0))
+        self.assertEqual(1.0, scorer.score('Gerhard', 0.99))
@@ -0,0 +1,30 @@
+import unittest
+
+from nltk.tokenize import word_tokenize
+
+from src.data_access.tokenization import (sentence_tokenizer, tokenize_page,
+                                          tokenize_pages)
+
+PAGES = [
+    'Braun an Gerhard. Rom, 23. Juli 1835. Von den anderen schönen Gefäßen dieser '
+    'Entdeckungen führen wir hier nur noch einen Kampf des Herkules mit dem Achelous auf.',
+    'Ihr Brief vom 3. d. M. ist mir richtig zugekommen; ich danke Ihnen herzlich dafür!',
+    '',
+]
+
+
+def tokenize_unbatched(text):
+    sentences = sentence_tokenizer().tokenize(text, realign_boundaries=True)
+    return [word_tokenize(sentence, 'german') for sentence in sentences]
+
+
+class TokenizationTest(unittest.TestCase):
+
+    def test_same_result_as_word_tokenize(self):
+        for page in PAGES:
+            self.assertEqual(tokenize_unbatched(page), tokenize_page(page))
+
+    def test_tokenize_pages_keeps_order(self):
+        expected = [tokenize_unbatched(page) for page in PAGES]
+        self.assertEqual(expected, tokenize_pages(PAGES))
+        self.assertEqual(expected, tokenize_pages(PAGES, processes=2, chunksize=1))
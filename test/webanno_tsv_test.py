@@ -2,9 +2,9 @@ import os.path
 import unittest
 
 from src.data_access.webanno_tsv import (
-    webanno_tsv_read_file, webanno_tsv_read_string,
-    Annotation, Document, Sentence, Token,
-    NO_LABEL_ID
+    webanno_tsv_read_file, webanno_tsv_read_labels, webanno_tsv_read_string, webanno_tsv_read_text,
+    entity_spans, parse_page_number, Annotation, Document, Sentence, SpanIndex, Token,
+    NO_LABEL_ID, NO_PAGE
 )
 from .test_util import test_file
 
@@ -36,6 +36,80 @@ class WebannoTsvModelTest(unittest.TestCase):
         self.assertEqual(strings, [t.text for t in doc.tokens])
 
 
+class WebannoSpanIndexTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.doc = Document(DEFAULT_LAYERS)
+        self.doc.add_tokens_as_sentence(['A', 'B', 'C'])
+        self.doc.add_tokens_as_sentence(['D', 'E'])
+        self.bc = Annotation(self.doc.tokens[1:3], 'l3', 'named_entity', 'BC', 3)
+        self.doc.add_annotation(self.bc)
+        self.doc.add_annotation(Annotation(self.doc.tokens[1:2], 'l2', 'lemma', 'b'))
+        self.index = SpanIndex(self.doc, 'l3', 'named_entity')
+
+    def test_positions(self):
+        self.assertEqual([0, 1, 2, 3, 4], [self.index.position(t) for t in self.doc.tokens])
+
+    def test_annotations_of_layer_only(self):
+        self.assertEqual([self.bc], self.index.annotations_on(self.doc.tokens))
+        self.assertEqual([], self.index.annotations_at(0))
+        self.assertEqual([self.bc], self.index.annotations_at(2))
+
+    def test_add_merged_and_remove(self):
+        added = self.doc.add_annotation(Annotation(self.doc.tokens[3:4], 'l3', 'named_entity', 'BC', 3))
+        self.assertIs(self.bc, added)
+        self.index.add(added)
+        self.assertEqual([self.bc], self.index.annotations_at(3))
+
+        self.doc.remove_annotation(self.bc)
+        self.index.remove(self.bc)
+        self.assertEqual([], self.index.annotations_on(self.doc.tokens))
+
+
+class WebannoEntitySpansTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.doc = Document(DEFAULT_LAYERS)
+        self.doc.add_tokens_as_sentence(['Braun', 'an', 'Eduard', 'Gerhard', '.'])
+        self.doc.add_tokens_as_sentence(['Rom', 'Rom'])
+        self.doc.path = '/data/000880098/000880098_page012.tsv'
+        tokens = self.doc.tokens
+        self.doc.add_annotation(Annotation(tokens[0:1], 'l3', 'named_entity', 'PERauthor'))
+        self.doc.add_annotation(Annotation(tokens[2:4], 'l3', 'named_entity', 'PERaddressee', 1))
+        self.doc.add_annotation(Annotation(tokens[5:6], 'l3', 'named_entity', 'PLACEfrom'))
+        self.doc.add_annotation(Annotation(tokens[6:7], 'l3', 'named_entity', 'PLACEfrom'))
+
+    def test_groups_tokens_of_same_annotation(self):
+        expected = [
+            ('Braun', 'PERauthor', '000880098', 12, 1),
+            ('Eduard Gerhard', 'PERaddressee', '000880098', 12, 1),
+            ('Rom', 'PLACEfrom', '000880098', 12, 2),
+            ('Rom', 'PLACEfrom', '000880098', 12, 2)
+        ]
+        spans = list(entity_spans(self.doc))
+        self.assertEqual(expected, [span[:5] for span in spans])
+        self.assertEqual(self.doc.tokens[2:4], spans[1].tokens)
+
+    def test_token_belongs_to_first_annotation(self):
+        # overlaps with 'Eduard Gerhard', which comes first in the document's annotations
+        self.doc.add_annotation(Annotation(self.doc.tokens[3:5], 'l2', 'lemma', 'x'))
+
+        self.assertEqual(['Braun', 'Eduard Gerhard', '.', 'Rom', 'Rom'],
+                         [span.text for span in entity_spans(self.doc)])
+        self.assertEqual(['Braun', 'Eduard Gerhard', 'Rom', 'Rom'],
+                         [span.text for span in entity_spans(self.doc, 'l3', 'named_entity')])
+        self.assertEqual(['Gerhard .'], [span.text for span in entity_spans(self.doc, 'l2', 'lemma')])
+        for span in entity_spans(self.doc):
+            self.assertIs(span.tokens[0].annotations[0].label, span.label)
+
+    def test_parse_page_number(self):
+        self.assertEqual(12, parse_page_number('/data/000880098/000880098_page012.tsv'))
+        self.assertEqual(NO_PAGE, parse_page_number('/data/test_input.tsv'))
+        self.assertEqual(3, parse_page_number('000880098_page003.tsv', strict=True))
+        with self.assertRaises(ValueError):
+            parse_page_number('/data/test_input.tsv', strict=True)
+
+
 class WebannoTsvReadRegularFilesTest(unittest.TestCase):
     TEXT_SENT_1 = "929 Prof. Gerhard Braun an Gerhard Rom , 23 . Juli 1835 Roma li 23 Luglio 1835 ."
     TEXT_SENT_2 = "Von den anderen schönen Gefäßen dieser Entdeckungen führen " \
@@ -63,6 +137,22 @@ class WebannoTsvReadRegularFilesTest(unittest.TestCase):
         text = "\n".join((self.TEXT_SENT_1, self.TEXT_SENT_2))
         self.assertEqual(text, self.doc.text)
 
+    def test_reads_text_only(self):
+        for name in ['test_input.tsv', 'test_input_multi_sentence_span.tsv', 'test_input_quotes.tsv']:
+            path = tsv_test_file(name)
+            self.assertEqual(webanno_tsv_read_file(path).text, webanno_tsv_read_text(path))
+
+    def test_reads_labels_only(self):
+        for name in ['test_input.tsv', 'test_input_multi_sentence_span.tsv', 'test_input_quotes.tsv']:
+            path = tsv_test_file(name)
+            doc = webanno_tsv_read_file(path)
+            expected = sorted(a.label for a in doc.annotations for _ in a.tokens)
+            self.assertEqual(expected, sorted(webanno_tsv_read_labels(path)))
+        path = tsv_test_file('test_input.tsv')
+        expected = sorted(a.label for a in webanno_tsv_read_file(path).annotations_with_type(
+            ACTUAL_DEFAULT_LAYER_NAMES[2][0], 'value') for _ in a.tokens)
+        self.assertEqual(expected, sorted(webanno_tsv_read_labels(path, ACTUAL_DEFAULT_LAYER_NAMES[2][0], 'value')))
+
     def test_reads_correct_tokens(self):
         fst, snd = self.doc.sentences
 
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from src.data_access.word_cloud_generator import (CLOUD_SIZE, WordCloudGenerator,
+                                                  WordCloudJob, circle_mask,
+                                                  top_words)
+
+RESSOURCE_PATH = 'resources/test_iob_data_transformer/input'
+
+
+def source_path() -> str:
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), RESSOURCE_PATH))
+
+
+class WordCloudGeneratorTest(unittest.TestCase):
+
+    def test_circle_mask(self):
+        mask = circle_mask()
+        self.assertIs(mask, circle_mask())
+        self.assertEqual(np.uint8, mask.dtype)
+        self.assertEqual((CLOUD_SIZE, CLOUD_SIZE), mask.shape)
+        self.assertEqual(255, mask[0, 0])
+        self.assertEqual(0, mask[CLOUD_SIZE // 2, CLOUD_SIZE // 2])
+        self.assertFalse(mask.flags.writeable)
+
+    def test_top_words(self):
+        self.assertEqual({'b': 3, 'a': 2, 'c': 2}, top_words({'a': 2, 'b': 3, 'c': 2, 'd': 1}, 3))
+
+    def test_generate_batch(self):
+        generator = WordCloudGenerator()
+        with tempfile.TemporaryDirectory() as tmp:
+            jobs = [WordCloudJob(os.path.join(tmp, 'total.png'), exclude_entity_types=['DATE']),
+                    WordCloudJob(os.path.join(tmp, 'dates', 'test.png'), word_entities={'test': 'PER'},
+                                 relation_entity_types=['DATE'])]
+
+            self.assertEqual([job.output_path for job in jobs],
+                             generator.generate_batch(source_path(), jobs, processes=2))
+            for job in jobs:
+                with Image.open(job.output_path) as image:
+                    self.assertEqual((CLOUD_SIZE, CLOUD_SIZE), image.size)
+            # the data of the last job is kept
+            self.assertEqual({'may 2021': 'DATE'}, generator.text_annotations)
@@ -0,0 +1,133 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from src.data_access import book_viewer_json
+
+from .test_util import write_entity_page
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'src', 'write_book_viewer_json.py')
+
+HEADER = [('Braun', 'PERauthor'), ('an', None), ('Gerhard', 'PERaddressee'), ('1.2.1833', 'DATEletter')]
+
+# book, page, sentences of (token, label) pairs
+PAGES = [
+    ('000000001', 1, [HEADER, [('Panofka', 'PERmentioned'), ('in', None), ('Rom', 'PLACEmentioned')]]),
+    ('000000001', 2, [[('Vase', 'OBJ'), ('aus', None), ('Neapel', 'PLACEmentioned')]]),
+    ('000000002', 1, [HEADER, [('Bunsen', 'PERmentioned')]]),
+]
+
+
+class WriteBookViewerJsonTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.tmp.name, 'annotations')
+        self.out_dir = os.path.join(self.tmp.name, 'out')
+        self.pages = []
+        for book, page, sentences in PAGES:
+            os.makedirs(os.path.join(self.input_dir, book), exist_ok=True)
+            self.pages.append(os.path.join(self.input_dir, book, '%s_page%03d.tsv' % (book, page)))
+            write_entity_page(self.pages[-1], sentences)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def run_script(self, *args: str, out_dir: str = None, check: bool = True) -> subprocess.CompletedProcess:
+        return subprocess.run([sys.executable, SCRIPT, '-i', self.input_dir, *args, out_dir or self.out_dir],
+                              capture_output=True, text=True, check=check)
+
+    def converted(self, *args: str, out_dir: str = None) -> int:
+        """
+        :return: The number of books converted by a run of the script with the args.
+        """
+        return int(re.match(r'Converted (\d+) of \d+ books', self.run_script(*args, out_dir=out_dir).stdout).group(1))
+
+    def output(self, out_dir: str = None) -> dict:
+        out_dir = out_dir or self.out_dir
+        result = {}
+        for name in sorted(os.listdir(out_dir)):
+            with open(os.path.join(out_dir, name), mode='rb') as f:
+                result[name] = f.read()
+        return result
+
+    @staticmethod
+    def touch(path: str):
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_incremental(self):
+        self.assertEqual(2, self.converted('--incremental'))
+        self.assertEqual(['.manifest.json', '000000001.json', '000000002.json'], list(self.output()))
+        self.assertEqual(0, self.converted('--incremental'))
+
+        # only the touched book is converted, the other one's output is left as it is
+        other_book = os.path.join(self.out_dir, '000000002.json')
+        with open(other_book, mode='w', encoding='utf-8') as f:
+            f.write('{}')
+        self.touch(self.pages[1])
+        self.assertEqual(1, self.converted('--incremental'))
+        self.assertEqual(b'{}', self.output()['000000002.json'])
+        self.assertEqual(0, self.converted('--incremental'))
+
+        # the output of other options is converted again
+        self.assertEqual(2, self.converted('--incremental', '--compact'))
+        self.assertEqual(0, self.converted('--incremental', '--compact'))
+        if book_viewer_json.orjson is not None:
+            self.assertEqual(2, self.converted('--incremental', '--compact', '--json-backend', 'orjson'))
+        self.assertEqual(2, self.converted('--incremental'))
+
+        os.remove(os.path.join(self.out_dir, '000000002.json'))
+        self.assertEqual(1, self.converted('--incremental'))
+        self.assertIn('000000002.json', self.output())
+
+        # without --incremental, all books are converted
+        self.assertEqual(2, self.converted())
+
+    def test_jobs(self):
+        self.assertEqual(2, self.converted())
+        jobs_dir = os.path.join(self.tmp.name, 'jobs')
+        self.assertEqual(2, self.converted('-j', '2', out_dir=jobs_dir))
+        self.assertEqual(self.output(), self.output(jobs_dir))
+
+    def test_unknown_labels(self):
+        write_entity_page(self.pages[2], [HEADER, [('morgen', 'TIME'), ('Bunsen', 'PERmentioned')]])
+        result = self.run_script('--incremental', check=False)
+        self.assertNotEqual(0, result.returncode)
+        self.assertIn("UnknownLabelError: Unknown labels: 'TIME' (%s)" % self.pages[2], result.stderr)
+        # the other book is written, the one with unknown labels is converted again next time
+        self.assertIn('Converted 1 of 2 books', result.stdout)
+        output = self.output()
+        self.assertEqual(['.manifest.json', '000000001.json'], list(output))
+        self.assertEqual(['000000001'], list(json.loads(output['.manifest.json'])))
+
+    def locations(self, book: str = '000000001') -> dict:
+        items = json.loads(self.output()[book + '.json'])['locations']['items']
+        return {item['lemma']: item for item in items}
+
+    def test_gazetteer(self):
+        coordinates_path = os.path.join(self.tmp.name, 'coordinates.csv')
+        with open(coordinates_path, mode='w', encoding='utf-8') as f:
+            f.write('gazetteer_id;longitude;latitude\n2323295;12.48;41.89\n')
+        self.assertEqual(2, self.converted('--incremental', '--coordinates', coordinates_path))
+        locations = self.locations()
+        self.assertEqual([{'id': '2323295', 'url': 'https://gazetteer.dainst.org/place/2323295', 'type': 'gazetteer'}],
+                         locations['Rom']['references'])
+        self.assertEqual([12.48, 41.89], locations['Rom']['coordinates'])
+        self.assertEqual('2338719', locations['Neapel']['references'][0]['id'])
+        self.assertIsNone(locations['Neapel']['coordinates'])
+
+        # the books are converted again with other coordinates
+        with open(coordinates_path, mode='a', encoding='utf-8') as f:
+            f.write('2338719;14.25;40.83\n')
+        self.assertEqual(2, self.converted('--incremental', '--coordinates', coordinates_path))
+        self.assertEqual([14.25, 40.83], self.locations()['Neapel']['coordinates'])
+        self.assertEqual(0, self.converted('--incremental', '--coordinates', coordinates_path))
+
+        self.assertEqual(2, self.converted('--incremental', '--no-gazetteer'))
+        for location in self.locations().values():
+            self.assertEqual(([], None), (location['references'], location['coordinates']))